@@ -0,0 +1,76 @@
+"""Benchmark format_message against the previous multi-pass implementation.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_html_format [--repeat N]
+
+Reports throughput (MB/s of input markdown), per-call latency, allocated
+blocks and peak traced memory, and how many output lines are identical in
+both implementations. The legacy formatter mangles bullets that also contain
+italics (the italic pass consumes the bullet asterisk), so those lines differ.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import legacy_html_format
+from benchmarks.samples import corpus
+from gemini_pro_bot import html_format
+
+
+def measure(format_message, texts, repeat):
+    total_chars = sum(len(text) for text in texts)
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            format_message(text)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    for text in texts:
+        format_message(text)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+
+    return {
+        "mb_per_s": total_chars / best / 1e6,
+        "us_per_call": best / len(texts) * 1e6,
+        "peak_kb": peak / 1024,
+        "live_blocks": blocks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    texts = corpus()
+    identical = lines = 0
+    for text in texts:
+        legacy = legacy_html_format.format_message(text).split("\n")
+        current = html_format.format_message(text).split("\n")
+        lines += len(legacy)
+        identical += sum(a == b for a, b in zip(legacy, current))
+    print(f"corpus: {len(texts)} responses, {sum(map(len, texts)) / 1024:.0f} KB")
+    print(f"identical output lines: {identical}/{lines}")
+    print(f"{'implementation':<16}{'MB/s':>8}{'us/call':>10}{'peak KB':>10}{'blocks':>8}")
+    for name, func in (
+        ("legacy", legacy_html_format.format_message),
+        ("single-pass", html_format.format_message),
+    ):
+        result = measure(func, texts, args.repeat)
+        print(
+            f"{name:<16}{result['mb_per_s']:>8.2f}{result['us_per_call']:>10.1f}"
+            f"{result['peak_kb']:>10.1f}{result['live_blocks']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
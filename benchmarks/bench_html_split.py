@@ -0,0 +1,109 @@
+"""Benchmark split_html against the previous sanitize_html + split_message pair.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_html_split [--repeat N] [--max-length N]
+
+The previous pair needs beautifulsoup4, which the bot no longer depends on;
+it is skipped when bs4 is not installed. Besides timing, the benchmark
+checks every part for length and tag balance and reports how many parts
+each implementation would have sent broken.
+"""
+
+import argparse
+import time
+from html.parser import HTMLParser
+
+from benchmarks.samples import corpus
+from gemini_pro_bot.html_format import format_message
+from gemini_pro_bot.html_split import split_html
+
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+
+def legacy_split_message(text, max_length=4000):
+    parts = []
+    while len(text) > max_length:
+        split_pos = text.rfind("\n", 0, max_length)
+        if split_pos == -1:
+            split_pos = text.rfind(". ", 0, max_length)
+            if split_pos != -1:
+                split_pos += 2
+        if split_pos <= 0:
+            # The original looped forever on a part starting with "\n"
+            split_pos = max_length
+        parts.append(text[:split_pos])
+        text = text[split_pos:]
+    if text:
+        parts.append(text)
+    return parts
+
+
+def legacy_sanitize_html(html):
+    allowed = {"b", "i", "u", "s", "a", "code", "pre"}
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.find_all(True):
+        if tag.name not in allowed:
+            tag.unwrap()
+        else:
+            tag.attrs = {k: v for k, v in tag.attrs.items() if k == "href"}
+    return str(soup)
+
+
+def legacy(html, max_length):
+    return legacy_split_message(legacy_sanitize_html(html), max_length)
+
+
+class _BalanceChecker(HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.balanced = True
+
+    def handle_starttag(self, tag, attrs):
+        self.stack.append(tag)
+
+    def handle_endtag(self, tag):
+        if not self.stack or self.stack.pop() != tag:
+            self.balanced = False
+
+
+def is_valid(part, max_length):
+    checker = _BalanceChecker()
+    checker.feed(part)
+    checker.close()
+    return len(part) <= max_length and checker.balanced and not checker.stack
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--max-length", type=int, default=4000)
+    args = parser.parse_args()
+
+    documents = [format_message(text) for text in corpus()]
+    implementations = [("split_html", split_html)]
+    if BeautifulSoup is None:
+        print("beautifulsoup4 is not installed, skipping the previous implementation")
+    else:
+        implementations.insert(0, ("bs4 + split", legacy))
+
+    print(f"corpus: {len(documents)} documents, {sum(map(len, documents)) / 1024:.0f} KB")
+    print(f"{'implementation':<16}{'us/doc':>10}{'parts':>8}{'broken':>8}")
+    for name, func in implementations:
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for html in documents:
+                func(html, args.max_length)
+            best = min(best, time.perf_counter() - start)
+        parts = [part for html in documents for part in func(html, args.max_length)]
+        broken = sum(not is_valid(part, args.max_length) for part in parts)
+        print(f"{name:<16}{best / len(documents) * 1e6:>10.1f}{len(parts):>8}{broken:>8}")
+
+
+if __name__ == "__main__":
+    main()
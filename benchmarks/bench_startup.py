@@ -0,0 +1,206 @@
+"""Startup benchmark: how soon a cold process is useful.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs N]
+
+Measures, as the median of fresh processes:
+
+* the import time of gemini_pro_bot.bot and gemini_pro_bot.handlers;
+* for main.py in polling and in webhook mode, the time from spawning the
+  process until the health port answers, until the bot takes updates (its
+  first getUpdates, or the first webhook delivery it accepts) and until the
+  first answer text reaches the chat.
+
+The Bot API is the stand-in from fake_telegram.py. Gemini is the stand-in
+from fake_gemini.py with no latency, so the first answer measures the bot
+rather than the model.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import runpy
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULES = ("gemini_pro_bot.bot", "gemini_pro_bot.handlers")
+WEBHOOK_SECRET = "bench"
+CHAT_ID = 777
+PROBE_INTERVAL = 0.01
+START_TIMEOUT = 60.0
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)"
+
+
+def child() -> None:
+    """Run main.py with the Gemini stand-in installed once the bot is built."""
+    from gemini_pro_bot import bot
+
+    build_application = bot.build_application
+
+    def build_with_fake_gemini():
+        application = build_application()
+        # Imported here: it loads google.generativeai, which main.py defers too
+        from benchmarks.fake_gemini import FakeGemini
+        from gemini_pro_bot import llm
+        from gemini_pro_bot.model_client import gemini_client
+
+        FakeGemini(first_chunk=0, tokens_per_second=1e6).install(
+            llm.model, llm.img_model, llm.summary_model, llm.fallback_model,
+            keys=gemini_client.pool.keys,
+        )
+        return application
+
+    bot.build_application = build_with_fake_gemini
+    runpy.run_path(str(ROOT / "main.py"), run_name="__main__")
+
+
+def import_time(module: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module)],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def make_update(update_id: int) -> dict:
+    user = {"id": CHAT_ID, "is_bot": False, "first_name": "Анна"}
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": CHAT_ID, "type": "private"},
+            "from": user,
+            "text": "Дата рождения 12.03.1990, что скажет число жизненного пути?",
+        },
+    }
+
+
+async def cold_start(telegram, bot_port: int, webhook: bool) -> dict:
+    """Spawn main.py once and time its way to the first answer."""
+    from benchmarks.load_test import STATUS_PREFIXES
+
+    telegram.events.clear()
+    telegram.updates[:] = [] if webhook else [make_update(1)]
+    telegram.first_poll = None
+    env = {
+        **os.environ,
+        "PORT": str(bot_port),
+        "WEBHOOK_URL": "https://bench.invalid" if webhook else "",
+        "WEBHOOK_SECRET": WEBHOOK_SECRET,
+        "LOG_LEVEL": "WARNING",
+    }
+    timings = {}
+    started = time.monotonic()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child"],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{bot_port}"
+    update = json.dumps(make_update(1))
+    try:
+        async with httpx.AsyncClient(timeout=5) as client:
+            while time.monotonic() - started < START_TIMEOUT:
+                if process.poll() is not None:
+                    raise RuntimeError(f"the bot exited with code {process.returncode}")
+                if "port" not in timings:
+                    try:
+                        await client.get(url + "/")
+                        timings["port"] = time.monotonic() - started
+                    except httpx.TransportError:
+                        pass
+                elif "ready" not in timings:
+                    if webhook:
+                        response = await client.post(
+                            url + "/webhook",
+                            content=update,
+                            headers={"X-Telegram-Bot-Api-Secret-Token": WEBHOOK_SECRET},
+                        )
+                        if response.status_code == 200:
+                            timings["ready"] = time.monotonic() - started
+                    elif telegram.first_poll is not None:
+                        timings["ready"] = telegram.first_poll - started
+                else:
+                    answered = [
+                        moment
+                        for moment, method, text in telegram.events[CHAT_ID]
+                        if not text.startswith(STATUS_PREFIXES)
+                    ]
+                    if answered:
+                        timings["answer"] = answered[0] - started
+                        return timings
+                await asyncio.sleep(PROBE_INTERVAL)
+        raise RuntimeError(f"no answer within {START_TIMEOUT:.0f}s: {timings}")
+    finally:
+        process.terminate()
+        try:
+            await asyncio.to_thread(process.wait, 10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+async def run(args) -> dict:
+    from benchmarks.fake_telegram import FakeTelegram
+
+    telegram = FakeTelegram(args.port, chat_rate=1000, chat_burst=1000, global_rate=1000)
+    await telegram.start()
+    results = {}
+    try:
+        for mode in ("polling", "webhook"):
+            runs = [
+                await cold_start(telegram, args.port + 1, webhook=mode == "webhook")
+                for _ in range(args.runs)
+            ]
+            results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+    finally:
+        await telegram.stop()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per measurement")
+    parser.add_argument("--port", type=int, default=18091)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+        return
+
+    from benchmarks.load_test import configure
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(f"http://127.0.0.1:{args.port}", workdir)
+        imports = {
+            module: statistics.median(import_time(module) for _ in range(args.runs))
+            for module in MODULES
+        }
+        results = asyncio.run(run(args))
+
+    for module, seconds in imports.items():
+        print(f"import {module:<26} {seconds:6.2f} s")
+    labels = {
+        "polling": ("port open", "first getUpdates", "first answer"),
+        "webhook": ("port open", "taking updates", "first answer"),
+    }
+    for mode, timings in results.items():
+        for label, seconds in zip(labels[mode], timings.values()):
+            print(f"{mode:<8} {label:<24} {seconds:6.2f} s")
+
+
+if __name__ == "__main__":
+    main()
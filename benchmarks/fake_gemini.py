@@ -0,0 +1,114 @@
+"""Local stand-in for the Gemini API used by the load test.
+
+Replaces the gRPC client behind the bot's GenerativeModel objects, so the
+whole google-generativeai path (ChatSession, streaming, retries) runs
+unchanged. Answers are built like the benchmark corpus and streamed in
+chunks after a configurable first-chunk latency, at a configurable token
+rate; a share of requests can fail with 503 or 429.
+"""
+
+import asyncio
+import random
+
+from google.api_core.exceptions import ResourceExhausted, ServiceUnavailable
+from google.generativeai import protos
+
+from benchmarks.samples import make_response
+
+# Rough size of a token in the corpus, which is mostly Russian
+CHARS_PER_TOKEN = 4
+
+
+def _response(text, finished, prompt_tokens, answer_tokens):
+    return protos.GenerateContentResponse(
+        candidates=[
+            protos.Candidate(
+                content=protos.Content(role="model", parts=[protos.Part(text=text)]),
+                finish_reason=protos.Candidate.FinishReason.STOP if finished else 0,
+            )
+        ],
+        usage_metadata=protos.GenerateContentResponse.UsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=answer_tokens,
+        ),
+    )
+
+
+def _prompt_tokens(request):
+    chars = sum(len(part.text) for content in request.contents for part in content.parts)
+    if request.system_instruction:
+        chars += sum(len(part.text) for part in request.system_instruction.parts)
+    return chars // CHARS_PER_TOKEN
+
+
+class FakeGemini:
+    """Async Gemini client with a scripted latency, token rate and error rate."""
+
+    def __init__(
+        self,
+        first_chunk=0.3,
+        tokens_per_second=200.0,
+        answer_tokens=300,
+        chunk_tokens=20,
+        error_rate=0.0,
+        seed=0,
+    ):
+        self.first_chunk = first_chunk
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens = answer_tokens
+        self.chunk_tokens = chunk_tokens
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.answers = [make_response(answer_tokens * CHARS_PER_TOKEN, variant) for variant in range(8)]
+        self.requests = 0
+        self.errors = 0
+
+    def install(self, *models, keys=()):
+        """Route the given models and API key pool entries to this client."""
+        for model in models:
+            if model is not None:
+                model._async_client = self
+        for key in keys:
+            key._client = self
+
+    def _fail(self):
+        self.requests += 1
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            error = ResourceExhausted if self.random.random() < 0.5 else ServiceUnavailable
+            raise error("Injected by the load test")
+
+    def _answer(self):
+        return self.random.choice(self.answers)[: self.answer_tokens * CHARS_PER_TOKEN]
+
+    async def stream_generate_content(self, request, **kwargs):
+        self._fail()
+        answer = self._answer()
+        prompt_tokens = _prompt_tokens(request)
+        step = self.chunk_tokens * CHARS_PER_TOKEN
+        delay = self.chunk_tokens / self.tokens_per_second
+
+        async def chunks():
+            await asyncio.sleep(self.first_chunk)
+            for start in range(0, len(answer), step):
+                if start:
+                    await asyncio.sleep(delay)
+                finished = start + step >= len(answer)
+                yield _response(
+                    answer[start : start + step],
+                    finished,
+                    prompt_tokens,
+                    len(answer) // CHARS_PER_TOKEN if finished else 0,
+                )
+
+        return chunks()
+
+    async def count_tokens(self, request, **kwargs):
+        # Used by the bot's startup warm-up
+        return protos.CountTokensResponse(total_tokens=1)
+
+    async def generate_content(self, request, **kwargs):
+        self._fail()
+        answer = self._answer()
+        await asyncio.sleep(self.first_chunk + self.answer_tokens / self.tokens_per_second)
+        return _response(answer, True, _prompt_tokens(request), len(answer) // CHARS_PER_TOKEN)
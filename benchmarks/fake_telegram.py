@@ -0,0 +1,177 @@
+"""Local stand-in for the Telegram Bot API used by the load test.
+
+Serves the few methods the bot calls (getMe, getUpdates, sendMessage,
+editMessageText, sendChatAction, getFile and file downloads), records every
+send and edit with its time, and answers 429 with ``retry_after`` the way
+Telegram does when a chat or the bot as a whole goes over its message rate.
+"""
+
+import asyncio
+import inspect
+import json
+import math
+import random
+import time
+from collections import defaultdict
+from io import BytesIO
+from urllib.parse import parse_qs
+
+import PIL.Image
+
+from server import AsyncHTTPServer
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+
+class _Bucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def wait(self):
+        """Seconds until one message is allowed; takes it if that is zero."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+def sample_photo(side=1280):
+    """A JPEG with some detail, so decoding and resizing cost something."""
+    image = PIL.Image.effect_mandelbrot((side, side * 3 // 4), (-2.0, -1.2, 1.0, 1.2), 100)
+    out = BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=90)
+    return out.getvalue()
+
+
+class FakeTelegram:
+    """Bot API stand-in with Telegram-like flood limits.
+
+    ``events[chat_id]`` lists ``(time, method, text)`` for every accepted
+    sendMessage and editMessageText. ``error_rate`` adds random 429s on
+    top of the rate limits.
+    """
+
+    def __init__(self, port, chat_rate=1.0, chat_burst=5, global_rate=30.0, error_rate=0.0, seed=0):
+        self.port = port
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.global_bucket = _Bucket(global_rate, global_rate)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.events = defaultdict(list)
+        self.calls = defaultdict(int)
+        self.rate_limited = 0
+        self.photo = sample_photo()
+        self._chats = {}
+        # Delivered by getUpdates; the load test feeds its updates directly instead
+        self.updates = []
+        # When the bot first asked for updates, i.e. finished starting up in polling mode
+        self.first_poll = None
+        self._message_id = 0
+        self._server = AsyncHTTPServer(self._handle, port)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    async def start(self):
+        await self._server.start()
+
+    async def stop(self):
+        await self._server.stop()
+
+    async def _handle(self, method, path, headers, body):
+        if method == "GET" and path.startswith("/file/"):
+            return 200, self.photo, {"Content-Type": "image/jpeg"}
+        api_method = path.rsplit("/", 1)[-1]
+        params = {key: values[0] for key, values in parse_qs(body.decode()).items()}
+        self.calls[api_method] += 1
+        handler = getattr(self, f"_{api_method}", None)
+        if handler is None:
+            return self._reply({"ok": True, "result": True})
+        result = handler(params)
+        if inspect.isawaitable(result):
+            result = await result
+        return self._reply(result)
+
+    def _reply(self, payload):
+        return 200 if payload["ok"] else payload["error_code"], json.dumps(payload).encode(), {
+            "Content-Type": "application/json"
+        }
+
+    def _limited(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = _Bucket(self.chat_rate, self.chat_burst)
+        wait = bucket.wait() or self.global_bucket.wait()
+        if not wait and self.random.random() < self.error_rate:
+            wait = 1.0
+        if not wait:
+            return None
+        self.rate_limited += 1
+        retry_after = max(1, math.ceil(wait))
+        return {
+            "ok": False,
+            "error_code": 429,
+            "description": f"Too Many Requests: retry after {retry_after}",
+            "parameters": {"retry_after": retry_after},
+        }
+
+    def _message(self, chat_id, text, message_id=None):
+        if message_id is None:
+            self._message_id += 1
+            message_id = self._message_id
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            "text": text,
+        }
+
+    def _getMe(self, params):
+        return {"ok": True, "result": BOT_USER}
+
+    async def _getUpdates(self, params):
+        if self.first_poll is None:
+            self.first_poll = time.monotonic()
+        offset = int(params.get("offset", 0))
+        updates = [update for update in self.updates if update["update_id"] >= offset]
+        if not updates:
+            # A short long poll, so a stopping bot is not kept waiting
+            await asyncio.sleep(min(float(params.get("timeout", 0)), 0.5))
+        return {"ok": True, "result": updates}
+
+    def _sendMessage(self, params):
+        chat_id = int(params["chat_id"])
+        error = self._limited(chat_id)
+        if error:
+            return error
+        self.events[chat_id].append((time.monotonic(), "send", params.get("text", "")))
+        return {"ok": True, "result": self._message(chat_id, params.get("text", ""))}
+
+    def _editMessageText(self, params):
+        chat_id = int(params["chat_id"])
+        error = self._limited(chat_id)
+        if error:
+            return error
+        self.events[chat_id].append((time.monotonic(), "edit", params.get("text", "")))
+        return {"ok": True, "result": self._message(chat_id, params["text"], int(params["message_id"]))}
+
+    def _getFile(self, params):
+        file_id = params["file_id"]
+        return {
+            "ok": True,
+            "result": {
+                "file_id": file_id,
+                "file_unique_id": file_id,
+                "file_size": len(self.photo),
+                "file_path": f"photos/{file_id}.jpg",
+            },
+        }
@@ -0,0 +1,277 @@
+"""Load test: simulated users against the real Application with fake backends.
+
+Run from the repository root:
+
+    python -m benchmarks.load_test [--users N] [--messages N] [--photo-share F]
+    python -m benchmarks.load_test --save    # store the result as the baseline
+
+Every user writes to its own private chat and waits for each answer plus a
+think time before sending the next message. Updates go through
+Application.process_update, so filters, handlers, the scheduler and the
+outbound queue run as in production, while Gemini and the Bot API are served
+by the stand-ins in fake_gemini.py and fake_telegram.py.
+
+The report shows throughput, time to the first edit with answer text,
+end-to-end latency (until the handler has delivered the whole answer) and
+memory per chat, and compares them with the saved baseline. Tuning settings
+such as GEMINI_CONCURRENCY or TELEGRAM_CHAT_RATE are read from the
+environment as usual; connections and storage are always local.
+"""
+
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.fake_gemini import FakeGemini
+from benchmarks.fake_telegram import FakeTelegram
+
+BASELINE = Path(__file__).with_name("load_test_baseline.json")
+# Edits that tell the user about the request rather than answer it
+STATUS_PREFIXES = ("Generating", "Queued", "Cancelled", "The model is overloaded")
+PROMPTS = (
+    "Меня зовут {name}, дата рождения {date}. Что говорит моё число жизненного пути?",
+    "Сделайте разбор по дате {date}, пожалуйста.",
+    "Какой у меня знак по китайскому гороскопу, если я родилась {date}?",
+    "{date} — что скажет квадрат Ло Шу?",
+)
+NAMES = ("Анна", "Мария", "Ольга", "Дмитрий", "Алексей", "Елена")
+METRICS = (
+    ("messages_per_s", "throughput, msg/s", True),
+    ("first_edit_p50_s", "first edit p50, s", False),
+    ("first_edit_p99_s", "first edit p99, s", False),
+    ("latency_p50_s", "end-to-end p50, s", False),
+    ("latency_p99_s", "end-to-end p99, s", False),
+    ("memory_per_chat_kb", "memory per chat, KB", False),
+)
+
+
+def configure(telegram_url, workdir):
+    """Point the bot at the stand-ins; must run before gemini_pro_bot is imported."""
+    os.environ.update(
+        {
+            "BOT_TOKEN": "123456:bench",
+            "GOOGLE_API_KEY": "bench",
+            "GOOGLE_API_KEYS": "",
+            "TELEGRAM_API_URL": telegram_url,
+            "WEBHOOK_URL": "",
+            "BOT_ROLE": "",
+            "WORKERS": "1",
+            "WORKER_URLS": "",
+            "WORKER_COUNT": "1",
+            "AUTHORIZED_USERS": "",
+            "CONTEXT_CACHE": "false",
+            "RESPONSE_CACHE": "off",
+            "GEMINI_FALLBACK_MODEL": "",
+            "SESSION_BACKEND": "sqlite",
+            "SESSION_DB_PATH": os.path.join(workdir, "sessions.sqlite3"),
+        }
+    )
+
+
+def rss_bytes():
+    """Resident memory of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return None
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def make_update(bot, update_id, user_id, rng, photo):
+    from telegram import Update
+
+    message = {
+        "message_id": update_id,
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private"},
+        "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"},
+    }
+    date = f"{rng.randint(1, 28):02d}.{rng.randint(1, 12):02d}.{rng.randint(1950, 2010)}"
+    text = rng.choice(PROMPTS).format(name=rng.choice(NAMES), date=date)
+    if photo:
+        file_id = f"photo-{update_id}"
+        message["photo"] = [
+            {"file_id": file_id, "file_unique_id": file_id, "width": 1280, "height": 960}
+        ]
+        message["caption"] = "Что вы видите на этой фотографии?"
+    else:
+        message["text"] = text
+    return Update.de_json({"update_id": update_id, "message": message}, bot)
+
+
+async def run_user(application, telegram, user_id, args, update_ids, samples):
+    rng = random.Random(user_id)
+    for _ in range(args.messages):
+        await asyncio.sleep(rng.uniform(0, 2 * args.think))
+        photo = rng.random() < args.photo_share
+        update = make_update(application.bot, next(update_ids), user_id, rng, photo)
+        events = telegram.events[user_id]
+        seen = len(events)
+        started = time.monotonic()
+        await application.process_update(update)
+        finished = time.monotonic()
+        first_edit = next(
+            (
+                moment
+                for moment, method, text in events[seen:]
+                if method == "edit" and not text.startswith(STATUS_PREFIXES)
+            ),
+            None,
+        )
+        samples.append(
+            {
+                "photo": photo,
+                "latency": finished - started,
+                "first_edit": None if first_edit is None else first_edit - started,
+            }
+        )
+
+
+async def run(args):
+    telegram = FakeTelegram(
+        args.port,
+        chat_rate=args.telegram_chat_rate,
+        global_rate=args.telegram_global_rate,
+        error_rate=args.telegram_429,
+    )
+    await telegram.start()
+
+    # Imported late: the bot reads its configuration at import time
+    from gemini_pro_bot import llm
+    from gemini_pro_bot.bot import build_application
+    from gemini_pro_bot.model_client import gemini_client
+
+    gemini = FakeGemini(
+        first_chunk=args.first_chunk,
+        tokens_per_second=args.tokens_per_second,
+        answer_tokens=args.answer_tokens,
+        error_rate=args.gemini_errors,
+    )
+    gemini.install(
+        llm.model, llm.img_model, llm.summary_model, llm.fallback_model, keys=gemini_client.pool.keys
+    )
+
+    application = build_application()
+    samples = []
+    update_ids = itertools.count(1)
+    async with application:
+        # One chat first, so one-time allocations do not count as per-chat memory
+        await run_user(application, telegram, 999, args, update_ids, [])
+        gc.collect()
+        memory_before = rss_bytes()
+        started = time.monotonic()
+        await asyncio.gather(
+            *(
+                run_user(application, telegram, user_id, args, update_ids, samples)
+                for user_id in range(1000, 1000 + args.users)
+            )
+        )
+        duration = time.monotonic() - started
+        gc.collect()
+        memory_after = rss_bytes()
+    await telegram.stop()
+
+    latencies = [sample["latency"] for sample in samples]
+    first_edits = [sample["first_edit"] for sample in samples if sample["first_edit"] is not None]
+    memory = None
+    if memory_before is not None:
+        memory = (memory_after - memory_before) / args.users / 1024
+    return {
+        "messages": len(samples),
+        "photos": sum(sample["photo"] for sample in samples),
+        "unanswered": len(samples) - len(first_edits),
+        "duration_s": duration,
+        "messages_per_s": len(samples) / duration,
+        "first_edit_p50_s": percentile(first_edits, 0.5),
+        "first_edit_p99_s": percentile(first_edits, 0.99),
+        "latency_p50_s": percentile(latencies, 0.5),
+        "latency_p99_s": percentile(latencies, 0.99),
+        "memory_per_chat_kb": memory,
+        "telegram_429": telegram.rate_limited,
+        "telegram_calls": dict(telegram.calls),
+        "gemini_requests": gemini.requests,
+        "gemini_errors": gemini.errors,
+    }
+
+
+def _format(value):
+    return "n/a" if value is None else f"{value:.3f}"
+
+
+def report(result, baseline):
+    print(
+        f"{result['messages']} messages ({result['photos']} photos) in {result['duration_s']:.1f}s, "
+        f"{result['unanswered']} without an answer"
+    )
+    print(
+        f"Telegram: {result['telegram_429']} answered with 429; "
+        f"Gemini: {result['gemini_requests']} requests, {result['gemini_errors']} injected errors"
+    )
+    header = f"{'metric':<22}{'current':>10}"
+    if baseline:
+        header += f"{'baseline':>10}{'change':>9}"
+    print(header)
+    for key, label, higher_is_better in METRICS:
+        line = f"{label:<22}{_format(result[key]):>10}"
+        old = baseline["result"].get(key) if baseline else None
+        if old is not None and result[key] is not None and old:
+            change = (result[key] - old) / old * 100
+            better = change > 0 if higher_is_better else change < 0
+            line += f"{_format(old):>10}{change:>+8.1f}%{'' if better or abs(change) < 5 else ' !'}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=2, help="messages per user")
+    parser.add_argument("--think", type=float, default=1.0, help="mean pause before a message, s")
+    parser.add_argument("--photo-share", type=float, default=0.1)
+    parser.add_argument("--first-chunk", type=float, default=0.3, help="Gemini latency, s")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--answer-tokens", type=int, default=300)
+    parser.add_argument("--gemini-errors", type=float, default=0.02, help="share of failed calls")
+    parser.add_argument("--telegram-chat-rate", type=float, default=1.0)
+    parser.add_argument("--telegram-global-rate", type=float, default=30.0)
+    parser.add_argument("--telegram-429", type=float, default=0.0, help="share of random 429s")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--save", action="store_true", help="save the result as the baseline")
+    args = parser.parse_args()
+
+    settings = {
+        key: value for key, value in vars(args).items() if key not in ("port", "baseline", "save")
+    }
+    baseline = None
+    if args.baseline.exists() and not args.save:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline["settings"] != settings:
+            print(f"{args.baseline} was recorded with other settings: {baseline['settings']}")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        configure(f"http://127.0.0.1:{args.port}", workdir)
+        result = asyncio.run(run(args))
+    report(result, baseline)
+    if args.save:
+        args.baseline.write_text(
+            json.dumps({"settings": settings, "result": result}, indent=2, ensure_ascii=False) + "\n"
+        )
+        print(f"Baseline saved to {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
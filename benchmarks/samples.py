@@ -0,0 +1,67 @@
+"""Deterministic corpus of model-like markdown responses for the benchmarks.
+
+The responses mimic what the numerologist prompt produces: headers, bold
+labels, bullet lists, occasional italics, links, monospace and fenced code,
+in Russian with some English mixed in.
+"""
+
+import random
+
+_HEADERS = [
+    "Число жизненного пути",
+    "Число судьбы",
+    "Квадрат Ло Шу",
+    "Японская нумерология",
+    "Тибетский цикл рождения",
+    "Рекомендации на год",
+]
+
+_SENTENCES = [
+    "Ваше число указывает на сильную волю и стремление к самостоятельности.",
+    "В китайской традиции это сочетание связано со стихией *Дерева* и ростом.",
+    "Обратите внимание на **кармические задачи**, они проявятся после 30 лет.",
+    "Энергия этого числа требует баланса между работой и отдыхом.",
+    "Подробнее о методе можно прочитать [здесь](https://example.com/numerology?a=1&b=2).",
+    "Формула расчёта: `1 + 9 + 9 + 0 = 19 -> 1 + 9 = 10 -> 1`.",
+    "Это __важный__ период для принятия решений, а ~~спешка~~ вредит.",
+    "Числа 3 < 5 и 7 > 4 образуют устойчивую линию в сетке.",
+    "Mastery of this number comes through patience and *quiet* persistence.",
+]
+
+_CODE = """```text
+4 | 9 | 2
+3 | 5 | 7
+8 | 1 | 6
+```"""
+
+
+def _paragraph(rng: random.Random) -> str:
+    return " ".join(rng.choice(_SENTENCES) for _ in range(rng.randint(2, 5)))
+
+
+def _section(rng: random.Random) -> str:
+    lines = [f"{'#' * rng.randint(2, 3)} **{rng.choice(_HEADERS)}**", "", _paragraph(rng), ""]
+    for _ in range(rng.randint(2, 5)):
+        lines.append(f"*   **{rng.choice(_HEADERS)}:** {rng.choice(_SENTENCES)}")
+    lines.append("")
+    if rng.random() < 0.3:
+        lines += [_CODE, ""]
+    lines.append(_paragraph(rng))
+    return "\n".join(lines)
+
+
+def make_response(size: int, seed: int = 0) -> str:
+    """Build a response of roughly ``size`` characters."""
+    rng = random.Random(seed)
+    sections = []
+    length = 0
+    while length < size:
+        section = _section(rng)
+        sections.append(section)
+        length += len(section) + 2
+    return "\n\n".join(sections)
+
+
+def corpus(sizes=(3000, 5000, 7000, 10000), per_size: int = 5) -> list[str]:
+    """Responses of 3–10 KB, ``per_size`` different ones for each size."""
+    return [make_response(size, seed) for size in sizes for seed in range(per_size)]
@@ -1,27 +1,129 @@
-import os
+import asyncio
+import hashlib
+import hmac
+import json
+import signal
+from typing import Callable
 from telegram import Update
 from telegram.ext import (
+    BaseUpdateProcessor,
     CommandHandler,
     MessageHandler,
+    TypeHandler,
     Application,
 )
-from gemini_pro_bot.filters import AuthFilter, MessageFilter, PhotoFilter
-from dotenv import load_dotenv
-from gemini_pro_bot.handlers import (
-    start,
-    help_command,
-    newchat_command,
-    handle_message,
-    handle_image,
+from gemini_pro_bot.cluster import (
+    FORWARD_QUEUE_SIZE,
+    IS_DISPATCHER,
+    IS_WORKER,
+    WORKER_PATH,
+    WORKER_PORT,
+    WORKER_URLS,
+    WORKERS,
+    LocalWorkers,
+    UpdateForwarder,
 )
+from gemini_pro_bot.filters import AuthFilter, MessageFilter, PhotoFilter
+from gemini_pro_bot.config import env_int, env_str, settings
+from gemini_pro_bot.metrics import render_metrics
+from server import AsyncHTTPServer
 
-load_dotenv()
+# Webhook mode is used when WEBHOOK_URL (the bot's public https URL) is set,
+# otherwise the bot falls back to long polling.
+WEBHOOK_URL = settings.webhook_url
+WEBHOOK_PATH = env_str("WEBHOOK_PATH", "/webhook")
+# Updates accepted but not yet handled; beyond this Telegram is told to retry later
+WEBHOOK_QUEUE_SIZE = env_int("WEBHOOK_QUEUE_SIZE", 100)
+# Bot API server, e.g. a self-hosted telegram-bot-api or the load-test stand-in
+TELEGRAM_API_URL = env_str("TELEGRAM_API_URL").rstrip("/")
 
 
-def start_bot() -> None:
-    """Start the bot."""
+def webhook_secret() -> str:
+    """Secret token Telegram sends back with every webhook delivery."""
+    secret = env_str("WEBHOOK_SECRET")
+    if secret:
+        return secret
+    # Stable across restarts and machines without extra configuration
+    return hashlib.sha256(settings.bot_token.encode()).hexdigest()[:32]
+
+
+def application_builder():
+    builder = Application.builder().token(settings.bot_token)
+    if TELEGRAM_API_URL:
+        builder = builder.base_url(f"{TELEGRAM_API_URL}/bot").base_file_url(
+            f"{TELEGRAM_API_URL}/file/bot"
+        )
+    return builder
+
+
+class BoundedUpdateProcessor(BaseUpdateProcessor):
+    """Processes updates concurrently, with at most ``limit`` accepted and unfinished.
+
+    With concurrent updates the Application takes every update off its
+    update_queue right away, so a bounded queue never fills. Instead,
+    webhook_handler reserves a place here before queueing an update and
+    answers 503 when there is none; the place is freed once the update's
+    handlers have finished.
+    """
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(max_concurrent_updates=limit)
+        self.limit = limit
+        self.pending = 0
+
+    def reserve(self) -> bool:
+        if self.pending >= self.limit:
+            return False
+        self.pending += 1
+        return True
+
+    def release(self) -> None:
+        self.pending -= 1
+
+    async def do_process_update(self, update, coroutine) -> None:
+        try:
+            await coroutine
+        finally:
+            self.release()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+def build_application() -> Application:
+    """Create the Application with all handlers registered."""
+    # Imported here rather than at the top: the handlers pull in
+    # google.generativeai, the slowest part of startup, which should not
+    # delay binding the port or starting a dispatcher (it never needs it)
+    from gemini_pro_bot.handlers import (
+        start,
+        help_command,
+        newchat_command,
+        handle_message,
+        handle_image,
+        trace_update,
+        warm_up,
+    )
+
     # Create the Application and pass it your bot's token.
-    application = Application.builder().token(os.getenv("BOT_TOKEN")).build()
+    # Updates are handled concurrently; handlers reserve their chat's place
+    # in the Gemini scheduler on arrival, so a chat is answered in order.
+    builder = application_builder().post_init(warm_up)
+    if WEBHOOK_URL or IS_WORKER:
+        builder = (
+            builder.updater(None)
+            .update_queue(asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE))
+            .concurrent_updates(BoundedUpdateProcessor(WEBHOOK_QUEUE_SIZE))
+        )
+    else:
+        builder = builder.concurrent_updates(True)
+    application = builder.build()
+
+    # Runs first for every update and opens its trace
+    application.add_handler(TypeHandler(Update, trace_update), group=-1)
 
     # on different commands - answer in Telegram
     application.add_handler(CommandHandler("start", start, filters=AuthFilter))
@@ -34,5 +136,156 @@ def start_bot() -> None:
     # Any image is sent to LLM to generate a response
     application.add_handler(MessageHandler(PhotoFilter, handle_image))
 
+    return application
+
+
+def build_dispatcher_application(forwarder: UpdateForwarder) -> Application:
+    """Create an Application that only hands updates over to the workers.
+
+    Updates are processed one at a time, so they are queued for the workers
+    in the order Telegram delivered them.
+    """
+    builder = application_builder().post_init(forwarder.start).post_shutdown(forwarder.stop)
+    if WEBHOOK_URL:
+        builder = builder.updater(None).update_queue(asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE))
+    application = builder.build()
+    application.add_handler(TypeHandler(Update, forwarder.forward))
+    return application
+
+
+def webhook_handler(application: Application, secret: str, update_path: str = WEBHOOK_PATH):
+    """HTTP handler serving Telegram webhook deliveries, metrics and health checks."""
+    processor = getattr(application, "update_processor", None)
+    if not isinstance(processor, BoundedUpdateProcessor):
+        # Updates processed one at a time (the dispatcher) fill the queue itself
+        processor = None
+
+    async def handle(method, path, headers, body):
+        if method == "POST" and path == update_path:
+            token = headers.get("x-telegram-bot-api-secret-token", "")
+            if not hmac.compare_digest(token, secret):
+                return 403, b"Forbidden"
+            try:
+                # JSON that is not an update object gives None ([], {}) or fails (1)
+                update = Update.de_json(json.loads(body), application.bot)
+            except Exception:
+                update = None
+            if update is None:
+                return 400, b"Bad Request"
+            if processor is not None and not processor.reserve():
+                # Telegram (or the dispatcher) redelivers the update later
+                return 503, b"Busy", {"Retry-After": "1"}
+            try:
+                application.update_queue.put_nowait(update)
+            except asyncio.QueueFull:
+                if processor is not None:
+                    processor.release()
+                return 503, b"Busy", {"Retry-After": "1"}
+            return 200, b""
+        if method == "GET" and path == "/metrics":
+            body, content_type = render_metrics()
+            return 200, body, {"Content-Type": content_type}
+        if method == "GET":
+            return 200, b"Bot is running"
+        return 404, b"Not Found"
+
+    return handle
+
+
+def starting_handler(update_path: str = WEBHOOK_PATH):
+    """HTTP handler used until the Application is built: healthy, but not taking updates."""
+
+    async def handle(method, path, headers, body):
+        if method == "POST" and path == update_path:
+            # Telegram (or the dispatcher) redelivers the update later
+            return 503, b"Starting", {"Retry-After": "1"}
+        if method == "GET" and path == "/metrics":
+            body, content_type = render_metrics()
+            return 200, body, {"Content-Type": content_type}
+        if method == "GET":
+            return 200, b"Bot is starting"
+        return 404, b"Not Found"
+
+    return handle
+
+
+async def run_webhook(
+    build: Callable[[], Application],
+    update_path: str = WEBHOOK_PATH,
+    port: int | None = None,
+    set_webhook: bool = True,
+) -> None:
+    """Serve webhooks, /health and /metrics on PORT until SIGINT/SIGTERM.
+
+    The port is bound before ``build`` runs, so health checks pass while
+    the heavy modules are still being imported. A worker serves the
+    updates posted by its dispatcher the same way, on its own port and
+    without registering a webhook with Telegram.
+    """
+    secret = webhook_secret()
+    server = AsyncHTTPServer(starting_handler(update_path), port or settings.port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    await server.start()
+    # Imports and setup run in a thread while the server keeps answering
+    application = await asyncio.to_thread(build)
+    server.handler = webhook_handler(application, secret, update_path)
+    async with application:
+        # Like run_polling, honour the Application's startup and shutdown hooks
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if set_webhook:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL + WEBHOOK_PATH,
+                allowed_updates=Update.ALL_TYPES,
+                secret_token=secret,
+            )
+        try:
+            await stop.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    if application.post_shutdown:
+        await application.post_shutdown(application)
+
+
+def run(build: Callable[[], Application]) -> None:
+    if WEBHOOK_URL:
+        asyncio.run(run_webhook(build))
+        return
+
     # Run the bot until the user presses Ctrl-C
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    build().run_polling(allowed_updates=Update.ALL_TYPES)
+
+
+def start_dispatcher() -> None:
+    """Receive updates and shard them by chat over the worker processes."""
+    workers = None
+    urls = WORKER_URLS
+    if not urls:
+        workers = LocalWorkers(WORKERS, WORKER_PORT)
+        workers.start()
+        urls = workers.urls
+    try:
+        forwarder = UpdateForwarder(urls, webhook_secret(), FORWARD_QUEUE_SIZE)
+        run(lambda: build_dispatcher_application(forwarder))
+    finally:
+        if workers is not None:
+            workers.stop()
+
+
+def start_bot() -> None:
+    """Start the bot."""
+    if IS_DISPATCHER:
+        start_dispatcher()
+        return
+    if IS_WORKER:
+        asyncio.run(run_webhook(build_application, WORKER_PATH, WORKER_PORT, set_webhook=False))
+        return
+    run(build_application)
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import zlib
+import httpx
+from gemini_pro_bot.config import env_int, env_list, env_str
+from telegram import Update
+from telegram.ext import ContextTypes
+
+logger = logging.getLogger(__name__)
+
+# "worker" for a process that handles updates forwarded by a dispatcher.
+# Any other process becomes the dispatcher when WORKERS > 1 or WORKER_URLS is set.
+BOT_ROLE = env_str("BOT_ROLE").lower()
+# Local worker processes started by the dispatcher
+WORKERS = env_int("WORKERS", 1)
+# Port a worker listens on; local worker i listens on WORKER_PORT + i
+WORKER_PORT = env_int("WORKER_PORT", 10100)
+# Workers on other machines, e.g. http://worker-1.internal:10100; replaces local ones
+WORKER_URLS = [url.rstrip("/") for url in env_list("WORKER_URLS")]
+WORKER_PATH = "/updates"
+# Workers sharing the Gemini and Telegram quotas; set for local workers automatically
+WORKER_COUNT = max(1, env_int("WORKER_COUNT", 1))
+# Updates waiting to be forwarded to one worker
+FORWARD_QUEUE_SIZE = env_int("FORWARD_QUEUE_SIZE", 1000)
+FORWARD_RETRY_DELAY = 0.5
+FORWARD_RETRY_MAX_DELAY = 10.0
+# Seconds a stopping dispatcher spends delivering updates it has already accepted
+FORWARD_DRAIN_TIMEOUT = 5.0
+
+IS_WORKER = BOT_ROLE == "worker"
+IS_DISPATCHER = not IS_WORKER and (WORKERS > 1 or bool(WORKER_URLS))
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def worker_for(chat_id: int, count: int) -> int:
+    """Index of the worker that owns a chat, the same in every process and run."""
+    return zlib.crc32(str(chat_id).encode()) % count
+
+
+def routing_key(update: Update) -> int:
+    """Chat of an update; updates without one are routed by user."""
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return 0
+
+
+class UpdateForwarder:
+    """Forwards updates to workers, every chat always to the same worker.
+
+    Each worker has a FIFO queue drained by a single sender that posts one
+    update at a time and retries it until the worker accepts it, so the
+    updates of a chat arrive in order. A full queue blocks ``forward``,
+    which pushes back on Telegram instead of dropping updates.
+    """
+
+    def __init__(self, urls: list[str], secret: str, queue_size: int = 1000) -> None:
+        self.urls = urls
+        self.secret = secret
+        self.queue_size = queue_size
+        self._queues: list[asyncio.Queue] = []
+        self._senders: list[asyncio.Task] = []
+        self._client: httpx.AsyncClient | None = None
+
+    async def start(self, application=None) -> None:
+        self._client = httpx.AsyncClient(timeout=30, headers={SECRET_HEADER: self.secret})
+        self._queues = [asyncio.Queue(self.queue_size) for _ in self.urls]
+        self._senders = [
+            asyncio.create_task(self._send_loop(url, queue))
+            for url, queue in zip(self.urls, self._queues)
+        ]
+        logger.info("Forwarding updates to %s workers", len(self.urls))
+
+    async def stop(self, application=None) -> None:
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(queue.join() for queue in self._queues)), FORWARD_DRAIN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            left = sum(queue.qsize() for queue in self._queues)
+            logger.warning("Dispatcher stopped with %s updates not forwarded", left)
+        for sender in self._senders:
+            sender.cancel()
+        await asyncio.gather(*self._senders, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+
+    async def forward(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Handler callback: queue the update for the worker that owns its chat."""
+        index = worker_for(routing_key(update), len(self.urls))
+        await self._queues[index].put(update.to_json())
+
+    async def _send_loop(self, url: str, queue: asyncio.Queue) -> None:
+        while True:
+            body = await queue.get()
+            try:
+                await self._post(url + WORKER_PATH, body)
+            finally:
+                queue.task_done()
+
+    async def _post(self, url: str, body: str) -> None:
+        delay = FORWARD_RETRY_DELAY
+        while True:
+            try:
+                response = await self._client.post(
+                    url, content=body, headers={"Content-Type": "application/json"}
+                )
+            except httpx.HTTPError as e:
+                logger.warning(
+                    "Forwarding to %s failed (%s), retry in %.1fs", url, type(e).__name__, delay
+                )
+            else:
+                if response.status_code == 200:
+                    return
+                if response.status_code in (400, 403):
+                    # Retrying would not help
+                    logger.error("Worker %s refused an update: HTTP %s", url, response.status_code)
+                    return
+                if response.status_code == 503:
+                    # The worker is busy; it says when to come back
+                    await asyncio.sleep(float(response.headers.get("Retry-After", delay)))
+                    continue
+                logger.warning(
+                    "Forwarding to %s failed (HTTP %s), retry in %.1fs", url, response.status_code, delay
+                )
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, FORWARD_RETRY_MAX_DELAY)
+
+
+class LocalWorkers:
+    """Worker processes on this machine, restarted if one of them exits."""
+
+    def __init__(self, count: int, base_port: int) -> None:
+        self.count = count
+        self.base_port = base_port
+        self.urls = [f"http://127.0.0.1:{base_port + i}" for i in range(count)]
+        self._processes: list[subprocess.Popen | None] = [None] * count
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        for index in range(self.count):
+            self._spawn(index)
+        threading.Thread(target=self._watch, daemon=True).start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        for process in self._processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for process in self._processes:
+            if process is not None:
+                try:
+                    process.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    def _spawn(self, index: int) -> None:
+        env = {
+            **os.environ,
+            "BOT_ROLE": "worker",
+            "WORKER_PORT": str(self.base_port + index),
+            "WORKER_COUNT": str(self.count),
+        }
+        self._processes[index] = subprocess.Popen([sys.executable, sys.argv[0]], env=env)
+        logger.info("Worker %s started on port %s", index, self.base_port + index)
+
+    def _watch(self) -> None:
+        while not self._stopping.wait(1):
+            for index, process in enumerate(self._processes):
+                if process.poll() is not None and not self._stopping.is_set():
+                    logger.error("Worker %s exited with code %s, restarting", index, process.returncode)
+                    time.sleep(1)
+                    self._spawn(index)
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+from gemini_pro_bot.config import env_int
+from google.api_core.exceptions import ResourceExhausted
+from gemini_pro_bot.llm import summary_model
+from gemini_pro_bot.model_client import gemini_client
+from gemini_pro_bot.scheduler import Rejected, gemini_scheduler
+from gemini_pro_bot.sessions import session_store
+from gemini_pro_bot.usage import record_usage
+
+logger = logging.getLogger(__name__)
+
+# Tokens a turn leaves in the context (its whole input plus the answer)
+# above which older turns are replaced by a summary
+HISTORY_TOKEN_BUDGET = env_int("HISTORY_TOKEN_BUDGET", 12000)
+# Latest question/answer pairs that are always kept verbatim
+HISTORY_KEEP_TURNS = env_int("HISTORY_KEEP_TURNS", 2)
+# Extractive fallback: characters kept from the start of every older answer
+EXTRACT_ANSWER_CHARS = 300
+# A slow summary call is abandoned for the extractive summary
+SUMMARY_TIMEOUT = 30
+
+SUMMARY_HEADER = "Краткое содержание предыдущей части нашей беседы:\n\n"
+SUMMARY_ACK = "Хорошо, я помню нашу беседу и продолжу с учётом этого."
+
+
+def content_text(content) -> str:
+    return "".join(part.text for part in content.parts)
+
+
+def split_history(history, keep_turns: int) -> tuple[list, list]:
+    """Split a history into older contents and the last ``keep_turns`` turns.
+
+    The recent part always starts with a user message, so the compacted
+    history keeps alternating roles.
+    """
+    starts = [i for i, content in enumerate(history) if content.role == "user"]
+    if len(starts) <= keep_turns:
+        return [], list(history)
+    cut = starts[-keep_turns] if keep_turns else len(history)
+    return list(history[:cut]), list(history[cut:])
+
+
+def transcript(contents) -> str:
+    """Render contents as a plain dialogue for the summary model."""
+    lines = []
+    for content in contents:
+        speaker = "Клиент" if content.role == "user" else "Румия"
+        lines.append(f"{speaker}: {content_text(content)}")
+    return "\n\n".join(lines)
+
+
+def extractive_summary(contents) -> str:
+    """Summary without a model call: client messages in full, answer openings."""
+    lines = []
+    for content in contents:
+        text = content_text(content).strip()
+        if content.role == "user":
+            lines.append(f"Клиент: {text}")
+        else:
+            if len(text) > EXTRACT_ANSWER_CHARS:
+                text = text[:EXTRACT_ANSWER_CHARS].rsplit(" ", 1)[0] + "…"
+            lines.append(f"Румия: {text}")
+    return "\n".join(lines)
+
+
+async def summarize(contents) -> str:
+    """Summarize contents with the summary model, falling back to extraction."""
+    started = time.monotonic()
+    try:
+        response = await asyncio.wait_for(
+            gemini_client.call(
+                summary_model,
+                lambda bound: bound.generate_content_async(transcript(contents)),
+                hedge=False,
+            ),
+            SUMMARY_TIMEOUT,
+        )
+        record_usage("summary", response, time.monotonic() - started)
+        summary = response.text.strip()
+        if summary:
+            return summary
+    except Exception as e:
+        logger.warning("History summary failed, using extractive summary: %s", e)
+    return extractive_summary(contents)
+
+
+def compacted_history(summary: str, recent) -> list:
+    return [
+        {"role": "user", "parts": [{"text": SUMMARY_HEADER + summary}]},
+        {"role": "model", "parts": [{"text": SUMMARY_ACK}]},
+        *recent,
+    ]
+
+
+class HistoryCompactor:
+    """Keeps each chat's prompt under a token budget.
+
+    After a turn that brought the context over ``budget`` tokens, older
+    turns are summarized in the background and replaced by the summary,
+    while the last ``keep_turns`` turns stay verbatim. Only the swap of the
+    history takes the chat's scheduler slot, and it is skipped if the
+    summarized turns changed in the meantime (e.g. after /new).
+    """
+
+    def __init__(self, budget: int, keep_turns: int) -> None:
+        self.budget = budget
+        self.keep_turns = keep_turns
+        self._tasks: dict[int, asyncio.Task] = {}
+
+    def maybe_compact(self, chat_id: int, context_tokens: int) -> None:
+        """Schedule compaction if the chat's context is over budget."""
+        if context_tokens <= self.budget or chat_id in self._tasks:
+            return
+        task = asyncio.get_running_loop().create_task(self._compact(chat_id, context_tokens))
+        self._tasks[chat_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(chat_id, None))
+
+    async def _compact(self, chat_id: int, tokens: int) -> None:
+        try:
+            chat = await session_store.get(chat_id)
+            history = list(chat.history)
+            older, recent = split_history(history, self.keep_turns)
+            if not older or (len(older) <= 2 and content_text(older[0]).startswith(SUMMARY_HEADER)):
+                # Only a previous summary is left; nothing to gain
+                return
+            # The summary is made outside the chat's turn, so the next message
+            # does not wait for it; it still counts against the quota under a
+            # scheduler key of its own. An earlier summary is folded in.
+            async with gemini_scheduler.slot(("summary", chat_id), tokens):
+                summary = await summarize(older)
+            async with gemini_scheduler.slot(chat_id, uses_model=False):
+                chat = await session_store.get(chat_id)
+                current = list(chat.history)
+                if current[:len(history)] != history:
+                    # Reset by /new or rewritten by another compaction; new
+                    # turns after the summarized ones are fine and kept below
+                    logger.info("History compaction of chat %s dropped: the history changed", chat_id)
+                    return
+                chat.history = compacted_history(summary, recent + current[len(history):])
+                await session_store.save(chat_id, chat)
+                logger.info("History of chat %s compacted: %s contents summarized", chat_id, len(older))
+        except (Rejected, ResourceExhausted) as e:
+            # Retried after the chat's next turn
+            logger.info("History compaction of chat %s postponed: %s", chat_id, e)
+
+
+history_compactor = HistoryCompactor(HISTORY_TOKEN_BUDGET, HISTORY_KEEP_TURNS)
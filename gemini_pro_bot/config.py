@@ -0,0 +1,87 @@
+import os
+import threading
+import time
+from dotenv import dotenv_values, find_dotenv, load_dotenv
+
+# Variables of the real environment win over .env, at startup and on reload
+_PROCESS_ENV = frozenset(os.environ)
+DOTENV_PATH = find_dotenv()
+load_dotenv(DOTENV_PATH)
+
+# Seconds between checks of .env for a changed AUTHORIZED_USERS
+SETTINGS_RELOAD_INTERVAL = 5.0
+
+
+def env_str(name: str, default: str = "") -> str:
+    return os.getenv(name, default)
+
+
+def env_int(name: str, default: int) -> int:
+    return int(os.getenv(name) or default)
+
+
+def env_float(name: str, default: float) -> float:
+    return float(os.getenv(name) or default)
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+
+def env_list(name: str) -> list[str]:
+    """Comma-separated values with blanks dropped."""
+    return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+
+
+def _mtime(path: str) -> float | None:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+class Settings:
+    """Settings the whole process shares, read once when it starts.
+
+    ``authorized_users()`` is the exception: it follows edits of .env
+    (checked at most every SETTINGS_RELOAD_INTERVAL seconds), so access
+    can be granted or revoked without a restart. A variable set in the
+    real environment is never overridden by .env.
+    """
+
+    def __init__(self) -> None:
+        self.bot_token = env_str("BOT_TOKEN")
+        # Several comma-separated keys spread the load; the first one is the main key
+        self.google_api_keys = env_list("GOOGLE_API_KEYS") or env_list("GOOGLE_API_KEY")
+        self.port = env_int("PORT", 10000)
+        self.webhook_url = env_str("WEBHOOK_URL").rstrip("/")
+        self._authorized_users = frozenset(env_list("AUTHORIZED_USERS"))
+        self._dotenv_mtime = _mtime(DOTENV_PATH) if DOTENV_PATH else None
+        self._checked = time.monotonic()
+        self._lock = threading.Lock()
+
+    def authorized_users(self) -> frozenset[str]:
+        """Usernames and user IDs allowed to use the bot; empty means everyone."""
+        if time.monotonic() - self._checked >= SETTINGS_RELOAD_INTERVAL:
+            self._reload()
+        return self._authorized_users
+
+    def _reload(self) -> None:
+        with self._lock:
+            self._checked = time.monotonic()
+            if not DOTENV_PATH or "AUTHORIZED_USERS" in _PROCESS_ENV:
+                return
+            mtime = _mtime(DOTENV_PATH)
+            if mtime == self._dotenv_mtime:
+                return
+            self._dotenv_mtime = mtime
+            value = dotenv_values(DOTENV_PATH).get("AUTHORIZED_USERS") or ""
+            self._authorized_users = frozenset(
+                item.strip() for item in value.split(",") if item.strip()
+            )
+
+
+settings = Settings()
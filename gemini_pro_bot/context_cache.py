@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+import google.generativeai as genai
+from google.api_core import exceptions as api_exceptions
+from gemini_pro_bot.config import env_bool, env_int
+from gemini_pro_bot.llm import MODEL_NAME, NUMEROLOGIST_PROMPT, SAFETY_SETTINGS, model
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_CACHE = env_bool("CONTEXT_CACHE", True)
+CONTEXT_CACHE_TTL = env_int("CONTEXT_CACHE_TTL", 3600)
+# Кэш продлевается, когда до истечения TTL остаётся меньше этого запаса
+CONTEXT_CACHE_REFRESH = env_int("CONTEXT_CACHE_REFRESH", 300)
+# Пауза перед новой попыткой, если создать кэш не удалось
+CONTEXT_CACHE_RETRY = 600
+
+# Ошибки, после которых кэшированная модель больше не годится
+CACHE_ERRORS = (
+    api_exceptions.NotFound,
+    api_exceptions.PermissionDenied,
+    api_exceptions.FailedPrecondition,
+)
+
+
+class ContextCache:
+    """Serves a model whose system instruction lives in Gemini cached content.
+
+    The cache is created and prolonged in the background: requests never wait
+    for cache calls and get the uncached ``fallback`` model until the cache
+    exists, while it is unavailable, or after ``invalidate``.
+    """
+
+    def __init__(self, model_name, system_instruction, fallback, ttl=3600, refresh=300) -> None:
+        self.model_name = model_name
+        self.system_instruction = system_instruction
+        self.fallback = fallback
+        self.ttl = ttl
+        self.refresh = refresh
+        self._cache = None
+        self._cached_model = None
+        self._expires = 0.0
+        self._retry_at = 0.0
+        self._task: asyncio.Task | None = None
+
+    def get_model(self):
+        """Return the cached model if it is usable, else the fallback."""
+        now = time.monotonic()
+        if now >= self._expires:
+            self._cached_model = None
+        if self._expires - now < self.refresh and now >= self._retry_at:
+            self._schedule()
+        return self._cached_model or self.fallback
+
+    def invalidate(self) -> None:
+        """Stop using the cache after a request rejected it; it is recreated later."""
+        self._cache = None
+        self._cached_model = None
+        self._expires = 0.0
+
+    def _schedule(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self) -> None:
+        started = time.monotonic()
+        try:
+            if self._cache is not None and started < self._expires:
+                await asyncio.to_thread(self._cache.update, ttl=self.ttl)
+            else:
+                self._cache = await asyncio.to_thread(
+                    genai.caching.CachedContent.create,
+                    model=self.model_name,
+                    display_name="numerologist-system-prompt",
+                    system_instruction=self.system_instruction,
+                    ttl=self.ttl,
+                )
+                self._cached_model = genai.GenerativeModel.from_cached_content(
+                    self._cache, safety_settings=SAFETY_SETTINGS
+                )
+            self._expires = started + self.ttl
+        except Exception as e:
+            logger.warning("Context cache unavailable, using uncached model: %s", e)
+            self.invalidate()
+            self._retry_at = time.monotonic() + CONTEXT_CACHE_RETRY
+
+
+class _NoCache:
+    """Stand-in used when CONTEXT_CACHE is disabled."""
+
+    def get_model(self):
+        return model
+
+    def invalidate(self) -> None:
+        pass
+
+
+context_cache = (
+    ContextCache(
+        MODEL_NAME,
+        NUMEROLOGIST_PROMPT,
+        model,
+        ttl=CONTEXT_CACHE_TTL,
+        refresh=CONTEXT_CACHE_REFRESH,
+    )
+    if CONTEXT_CACHE
+    else _NoCache()
+)
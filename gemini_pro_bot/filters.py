@@ -1,22 +1,17 @@
-import os
 from telegram import Update
 from telegram.ext.filters import UpdateFilter, COMMAND, TEXT, PHOTO
-from dotenv import load_dotenv
-
-load_dotenv()
-
-_AUTHORIZED_USERS = [
-    i.strip() for i in os.getenv("AUTHORIZED_USERS", "").split(",") if i.strip()
-]
+from gemini_pro_bot.config import settings
 
 
 class AuthorizedUserFilter(UpdateFilter):
     def filter(self, update: Update):
-        if not _AUTHORIZED_USERS:
+        # Re-read on every update: AUTHORIZED_USERS follows edits of .env
+        users = settings.authorized_users()
+        if not users:
             return True
         return (
-            update.message.from_user.username in _AUTHORIZED_USERS
-            or str(update.message.from_user.id) in _AUTHORIZED_USERS
+            update.message.from_user.username in users
+            or str(update.message.from_user.id) in users
         )
 
 
@@ -1,6 +1,15 @@
 import asyncio
-import re
-from gemini_pro_bot.llm import model, img_model
+import logging
+import time
+from gemini_pro_bot.compaction import history_compactor
+from gemini_pro_bot.config import env_float, env_int
+from gemini_pro_bot.context_cache import CACHE_ERRORS, context_cache
+from gemini_pro_bot.llm import fallback_model, img_model, model
+from gemini_pro_bot.model_client import gemini_client
+from gemini_pro_bot.usage import record_usage
+from gemini_pro_bot.sessions import session_store
+from gemini_pro_bot.scheduler import Rejected, gemini_scheduler, generations
+from google.api_core.exceptions import ResourceExhausted
 from google.generativeai.types.generation_types import (
     StopCandidateException,
     BlockedPromptException,
@@ -12,54 +21,235 @@ from telegram.ext import (
 from telegram.error import NetworkError, BadRequest
 from telegram.constants import ChatAction, ParseMode
 from gemini_pro_bot.html_format import format_message
-import PIL.Image as load_image
-from io import BytesIO
-import telegram
-from bs4 import BeautifulSoup   # Новый импорт
-
-# --- Функции для разбивки и очистки текста ---
-
-def split_message(text, max_length=4000):
-    """Разбивает длинное сообщение на части по max_length символов."""
-    parts = []
-    while len(text) > max_length:
-        split_pos = text.rfind('\n', 0, max_length)
-        if split_pos == -1:
-            split_pos = text.rfind('. ', 0, max_length)
-            if split_pos != -1:
-                split_pos += 2
-        if split_pos == -1:
-            split_pos = max_length
-        part = text[:split_pos]
-        text = text[split_pos:]
-        parts.append(part)
-    if text:
-        parts.append(text)
-    return parts
+from gemini_pro_bot.html_split import split_html
+from gemini_pro_bot.llm import NUMEROLOGIST_PROMPT, PAGINATE_ANSWERS
+from gemini_pro_bot.metrics import (
+    ERRORS,
+    FIRST_REPLY,
+    GEMINI_FIRST_CHUNK,
+    GEMINI_STREAM,
+    RENDER,
+    track_request,
+)
+from gemini_pro_bot.numerology import numerology_context
+from gemini_pro_bot.response_cache import response_cache
+from gemini_pro_bot.pagination import (
+    CONTINUE_PROMPT,
+    PAGE_LENGTH,
+    is_continuation,
+    paginate,
+    split_text,
+)
+from gemini_pro_bot.images import album_buffer, load_photo
+from gemini_pro_bot.outbound import outbound
+from gemini_pro_bot.logs import redact, start_trace
 
-def sanitize_html(html: str) -> str:
-    # Оставляет только корректные поддерживаемые теги Telegram
-    allowed = {"b", "i", "u", "s", "a", "code", "pre"}
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup.find_all(True):
-        if tag.name not in allowed:
-            tag.unwrap()
-        else:
-            tag.attrs = {k: v for k, v in tag.attrs.items() if k == "href"}
-    return str(soup)
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4000
+# Telegram ограничивает частоту правок (~1 в секунду на чат), поэтому
+# промежуточные правки копятся по времени и по объёму нового текста.
+STREAM_EDIT_INTERVAL = env_float("STREAM_EDIT_INTERVAL", 1.5)
+STREAM_EDIT_MIN_CHARS = env_int("STREAM_EDIT_MIN_CHARS", 80)
+# Примерная стоимость запроса с картинкой для планировщика
+IMAGE_TOKENS = 1000
+# Пауза для всех запросов к модели после ответа 429
+QUOTA_BACKOFF = 30
+SUPERSEDED_TEXT = "Cancelled: answering your newer message instead."
 
 async def safe_send(send_method, *args, **kwargs):
-    try:
-        return await send_method(*args, **kwargs)
-    except telegram.error.Forbidden:
-        print("User blocked the bot. Message skipped.")
-    except telegram.error.BadRequest as e:
-        print(f"BadRequest: {e}")
-    except Exception as e:
-        print(f"Other send message error: {e}")
+    """Отправка через общую очередь с учётом лимитов Telegram; при ошибке None."""
+    return await outbound.send(send_method, *args, **kwargs)
+
+def render_parts(text: str) -> list[str]:
+    """Переводит markdown в HTML Telegram и делит его на сообщения."""
+    started = time.monotonic()
+    html = format_message(text)
+    formatted = time.monotonic()
+    parts = split_html(html, MAX_MESSAGE_LENGTH)
+    RENDER.labels("format_message").observe(formatted - started)
+    RENDER.labels("split_html").observe(time.monotonic() - formatted)
+    return parts
+
+class StreamingReply:
+    """Показывает ответ модели по мере генерации, редактируя init_msg.
+
+    Правки объединяются: не чаще STREAM_EDIT_INTERVAL секунд и только если
+    пришло не меньше STREAM_EDIT_MIN_CHARS новых символов. Когда часть
+    превышает MAX_MESSAGE_LENGTH, она дописывается окончательно, а ответ
+    продолжается новым сообщением.
 
-def new_chat(context: ContextTypes.DEFAULT_TYPE) -> None:
-    context.chat_data["chat"] = model.start_chat()
+    С page_length показывается только первая страница ответа, с подсказкой
+    footer в конце; остальной текст копится в rest.
+    """
+
+    def __init__(self, update: Update, message, page_length=None, footer="") -> None:
+        self.update = update
+        self.message = message
+        self.page_length = page_length
+        self.footer = footer
+        self.text = ""
+        self.rest = ""
+        self.first_chunk_at = None
+        self._part = ""
+        self._rendered = ""
+        # Текст, который последняя промежуточная отправка показала в message,
+        # и future её правки (None, если отправка была ожидаемой)
+        self._sent = ""
+        self._edit = None
+        self._last_edit = 0.0
+
+    async def consume(self, response) -> str:
+        """Читает поток chunks до конца и возвращает весь текст ответа."""
+        async for chunk in response:
+            try:
+                text = chunk.text
+            except Exception as e:
+                logger.warning("Chunk without text: %s", e)
+                continue
+            await self.add(text)
+        await self.finish()
+        return self.text
+
+    async def add(self, text: str) -> None:
+        """Добавляет очередной фрагмент ответа."""
+        if not text:
+            return
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.monotonic()
+        self.text += text
+        if self.rest:
+            self.rest += text
+            return
+        self._part += text
+        if self.page_length and len(self._part) > self.page_length:
+            self._part, self.rest = split_text(self._part, self.page_length)
+            await self._render(final=False)
+            return
+        while len(self._part) > MAX_MESSAGE_LENGTH:
+            await self._rollover()
+        if self._should_edit():
+            await self._render(final=False)
+
+    async def finish(self) -> None:
+        """Дописывает последнюю часть ответа окончательно."""
+        if self._part:
+            if self.rest.strip():
+                self._part += "\n\n" + self.footer
+            await self._render(final=True)
+
+    async def interrupt(self, note: str) -> None:
+        """Завершает прерванный ответ: дописывает note к показанному тексту."""
+        if not self._rendered and self.message is not None:
+            await safe_send(self.message.edit_text, note)
+            return
+        self._part = f"{self._rendered}\n\n{note}".lstrip()
+        await self._render(final=True)
+
+    def _should_edit(self) -> bool:
+        if not self._rendered:
+            # Первый chunk показываем сразу
+            return True
+        if time.monotonic() - self._last_edit < STREAM_EDIT_INTERVAL:
+            return False
+        return len(self._part) - len(self._rendered) >= STREAM_EDIT_MIN_CHARS
+
+    async def _rollover(self) -> None:
+        head, self._part = split_text(self._part, MAX_MESSAGE_LENGTH)
+        await self._send(head, final=True)
+        self.message = None
+        self._rendered = ""
+        self._sent = ""
+        self._edit = None
+
+    async def _render(self, final: bool) -> None:
+        if self._part == self._rendered and not final:
+            return
+        if final and self._part == self._sent and await self._delivered():
+            # Последняя промежуточная правка уже показала этот текст; повтор
+            # Telegram отклонил бы с "message is not modified"
+            self._rendered = self._part
+            return
+        if await self._send(self._part, final=final):
+            self._sent = self._part
+        self._rendered = self._part
+        self._last_edit = time.monotonic()
+
+    async def _delivered(self) -> bool:
+        """Дошла ли последняя промежуточная отправка до Telegram."""
+        if self._edit is None:
+            return self.message is not None
+        return await asyncio.shield(self._edit) is not None
+
+    async def _send(self, plain: str, final: bool) -> bool:
+        """Отправляет plain; False, если промежуточная отправка пропущена."""
+        parts = render_parts(plain)
+        if not final and len(parts) > 1:
+            # Разметка раздула текст; дождёмся окончательной отправки
+            return False
+        self._edit = None
+        for i, part in enumerate(parts):
+            if self.message is None or i > 0:
+                self.message = await safe_send(
+                    self.update.message.reply_text,
+                    text=part,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                )
+            elif not final:
+                # Промежуточную правку не ждём: если она не успела уйти,
+                # следующая просто заменит её текст в очереди
+                self._edit = outbound.submit(
+                    self.message.edit_text,
+                    text=part,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                )
+            else:
+                await safe_send(
+                    self.message.edit_text,
+                    text=part,
+                    parse_mode=ParseMode.HTML,
+                    disable_web_page_preview=True,
+                )
+        return True
+
+async def reply_formatted(update: Update, text: str) -> None:
+    """Отправляет markdown-текст ответом, разбивая его на сообщения."""
+    for part in render_parts(text):
+        await safe_send(
+            update.message.reply_text,
+            text=part,
+            parse_mode=ParseMode.HTML,
+            disable_web_page_preview=True,
+        )
+
+def finish_generation(kind: str, response, reply: StreamingReply, started: float) -> None:
+    """Записывает задержки и расход токенов завершённого потока."""
+    finished = time.monotonic()
+    if reply.first_chunk_at is not None:
+        GEMINI_FIRST_CHUNK.labels(kind).observe(reply.first_chunk_at - started)
+    GEMINI_STREAM.labels(kind).observe(finished - started)
+    record_usage(kind, response, finished - started)
+
+
+async def warm_up(application) -> None:
+    """Хук post_init: соединения с Gemini открываются в фоне, пока бот уже принимает апдейты."""
+    gemini_client.warm_up(model)
+
+
+async def trace_update(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
+    """Выполняется перед остальными обработчиками: у каждого апдейта свой trace ID."""
+    start_trace(update.effective_chat.id if update.effective_chat else None)
+    message = update.effective_message
+    logger.info(
+        "Update received",
+        extra={
+            "update_id": update.update_id,
+            "kind": "photo" if message is not None and message.photo else "text",
+            "user_id": update.effective_user.id if update.effective_user else None,
+        },
+    )
 
 async def start(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
@@ -82,115 +272,274 @@ Send a message to the bot to generate a response.
     await safe_send(update.message.reply_text, help_text)
 
 async def newchat_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    init_msg = await safe_send(
-        update.message.reply_text,
-        text="Starting new chat session...",
-        reply_to_message_id=update.message.message_id,
-    )
-    new_chat(context)
+    # Сброс ждёт окончания генераций, пришедших в этот чат раньше него
+    turn = gemini_scheduler.reserve(update.effective_chat.id)
+    try:
+        init_msg = await safe_send(
+            update.message.reply_text,
+            text="Starting new chat session...",
+            reply_to_message_id=update.message.message_id,
+        )
+        async with gemini_scheduler.slot(update.effective_chat.id, uses_model=False, turn=turn):
+            await session_store.reset(update.effective_chat.id)
+    finally:
+        gemini_scheduler.cancel(turn)
+    context.chat_data.pop("pages", None)
     await safe_send(init_msg.edit_text, "New chat session started.")
 
+def context_tokens(response) -> int:
+    """Токены, которые история займёт в следующем запросе: вход и ответ этого хода."""
+    try:
+        meta = response.usage_metadata
+        return meta.prompt_token_count + meta.candidates_token_count
+    except Exception:
+        return 0
+
+def estimate_tokens(chat, text: str) -> int:
+    """Грубая оценка входных токенов запроса для планировщика (~3 символа на токен)."""
+    chars = len(NUMEROLOGIST_PROMPT) + len(text)
+    try:
+        chars += sum(len(part.text) for content in chat.history for part in content.parts)
+    except Exception:
+        pass
+    return chars // 3
+
+def queue_notifier(init_msg):
+    """Сообщает пользователю место в очереди, пока запрос ждёт модель."""
+    async def notify(position: int) -> None:
+        if init_msg is not None:
+            await safe_send(init_msg.edit_text, f"Queued, position {position}. Generating soon...")
+    return notify
+
+async def report_superseded(init_msg) -> None:
+    """Помечает ответ, отменённый новым сообщением, если он не начал генерироваться."""
+    if init_msg is not None:
+        await safe_send(init_msg.edit_text, SUPERSEDED_TEXT)
+
+async def report_rejection(init_msg, error: Exception) -> None:
+    if isinstance(error, ResourceExhausted):
+        ERRORS.labels("ResourceExhausted").inc()
+        logger.warning("Gemini quota exhausted: %s", error)
+        gemini_scheduler.backoff(QUOTA_BACKOFF)
+        text = "The model is overloaded right now. Please try again in a minute."
+    else:
+        text = str(error)
+    if init_msg is not None:
+        await safe_send(init_msg.edit_text, text)
+
+@track_request
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if context.chat_data.get("chat") is None:
-        new_chat(context)
+    received = time.monotonic()
+    chat_id = update.effective_chat.id
     text = update.message.text
-    init_msg = await safe_send(
-        update.message.reply_text,
-        text="Generating...", reply_to_message_id=update.message.message_id
-    )
-    await update.message.chat.send_action(ChatAction.TYPING)
-    chat = context.chat_data.get("chat")
-    response = None
+    # Следующая страница уже готова: отдаём её без обращения к модели
+    pages = context.chat_data.pop("pages", None)
+    if pages and is_continuation(text):
+        page = pages.pop(0)
+        if pages:
+            context.chat_data["pages"] = pages
+            page += "\n\n" + CONTINUE_PROMPT
+        await reply_formatted(update, page)
+        FIRST_REPLY.observe(time.monotonic() - received)
+        return
+    # Место в очереди чата занимаем до первого await: обработчики идут
+    # параллельно, и иначе сообщения чата могли бы встать в неё не по порядку
+    turn = gemini_scheduler.reserve(chat_id)
+    init_msg = None
+    admitted = False
     try:
-        response = await chat.send_message_async(text, stream=True)
+        init_msg = await safe_send(
+            update.message.reply_text,
+            text="Generating...", reply_to_message_id=update.message.message_id
+        )
+        FIRST_REPLY.observe(time.monotonic() - received)
+        # Отклонённый запрос не должен отменять тот, что уже ждёт ответа
+        if turn.rejected is not None:
+            raise turn.rejected
+        # Более новое сообщение отменит этот запрос
+        generations.begin(chat_id)
+        chat = await session_store.get(chat_id)
+        tokens = estimate_tokens(chat, text)
+        # Первый вопрос без истории мог уже задаваться: ответ берём из кэша
+        cached = None if chat.history else await response_cache.get(text)
+        async with gemini_scheduler.slot(
+            chat_id, tokens, uses_model=cached is None, on_queued=queue_notifier(init_msg), turn=turn
+        ):
+            admitted = True
+            if cached is None or not await serve_cached_reply(update, context, init_msg, text, cached):
+                await generate_chat_reply(update, context, init_msg, text)
+    except (Rejected, ResourceExhausted) as e:
+        await report_rejection(init_msg, e)
+    except asyncio.CancelledError:
+        if not generations.superseded():
+            raise
+        if not admitted:
+            await report_superseded(init_msg)
+    finally:
+        gemini_scheduler.cancel(turn)
+        generations.end(chat_id)
+
+def new_reply(update: Update, init_msg) -> StreamingReply:
+    if PAGINATE_ANSWERS:
+        return StreamingReply(update, init_msg, page_length=PAGE_LENGTH, footer=CONTINUE_PROMPT)
+    return StreamingReply(update, init_msg)
+
+def user_content(text: str):
+    """Сообщение для модели: текст и, если есть даты или имена, готовые расчёты."""
+    # Даты и имена считаем сами: модели остаётся только толкование
+    numbers = numerology_context(text)
+    return [numbers, text] if numbers else text
+
+async def serve_cached_reply(update: Update, context: ContextTypes.DEFAULT_TYPE, init_msg, text: str, answer: str) -> bool:
+    """Отвечает из кэша и записывает ответ в историю, чтобы уточнения работали.
+
+    Возвращает False, если пока запрос ждал очереди, у чата появилась история.
+    """
+    chat_id = update.effective_chat.id
+    chat = await session_store.get(chat_id)
+    if chat.history:
+        return False
+    reply = new_reply(update, init_msg)
+    await reply.add(answer)
+    await reply.finish()
+    content = user_content(text)
+    chat.history = [
+        {"role": "user", "parts": content if isinstance(content, list) else [content]},
+        {"role": "model", "parts": [answer]},
+    ]
+    await session_store.save(chat_id, chat)
+    if reply.rest.strip():
+        context.chat_data["pages"] = paginate(reply.rest)
+    return True
+
+async def generate_chat_reply(update: Update, context: ContextTypes.DEFAULT_TYPE, init_msg, text: str) -> None:
+    chat_id = update.effective_chat.id
+    # Статус "печатает" не ждём: запрос к модели не должен стоять за ним
+    # в очереди отправки, пока действуют лимиты Telegram
+    outbound.submit(update.message.chat.send_action, ChatAction.TYPING)
+    chat = await session_store.get(chat_id)
+    started = time.monotonic()
+    history = chat.history[:]
+    # Показываем ответ по мере генерации, не дожидаясь конца потока
+    reply = new_reply(update, init_msg)
+    content = user_content(text)
+
+    def request(bound_model):
+        # Каждая попытка (повтор, дублирующий запрос) идёт в своей копии
+        # сессии; история чата обновляется только после полного ответа
+        session = bound_model.start_chat(history=history)
+
+        async def send():
+            return session, await session.send_message_async(content, stream=True)
+
+        return send()
+
+    # Системная инструкция берётся из кэша Gemini, пока он доступен
+    preferred = context_cache.get_model()
+    try:
+        try:
+            session, response = await gemini_client.call(preferred, request, fallback=fallback_model)
+        except CACHE_ERRORS as e:
+            if preferred is model:
+                raise
+            logger.warning("Cached model rejected the request, retrying uncached: %s", e)
+            context_cache.invalidate()
+            session, response = await gemini_client.call(model, request, fallback=fallback_model)
     except StopCandidateException as sce:
-        print("Prompt: ", text, " was stopped. User: ", update.message.from_user)
-        print(sce)
+        ERRORS.labels("StopCandidateException").inc()
+        # Текст запроса в лог попадает только с LOG_PROMPTS
+        logger.warning(
+            "Generation stopped by the model",
+            extra={"prompt": redact(text), "user_id": update.message.from_user.id},
+        )
         await safe_send(init_msg.edit_text, "The model unexpectedly stopped generating.")
-        chat.rewind()
         return
     except BlockedPromptException as bpe:
-        print("Prompt: ", text, " was blocked. User: ", update.message.from_user)
-        print(bpe)
+        ERRORS.labels("BlockedPromptException").inc()
+        logger.warning(
+            "Prompt blocked: %s",
+            bpe,
+            extra={"prompt": redact(text), "user_id": update.message.from_user.id},
+        )
         await safe_send(init_msg.edit_text, "Blocked due to safety concerns.")
-        if response:
-            await response.resolve()
         return
+    except asyncio.CancelledError:
+        await reply.interrupt(SUPERSEDED_TEXT)
+        raise
 
-    full_plain_message = ""
-    # Копим chunks без отправки!
-    async for chunk in response:
-        try:
-            if chunk.text:
-                full_plain_message += chunk.text
-        except Exception as e:
-            print(e)
-            continue
-        await asyncio.sleep(0.1)
-
-    # Только теперь отправка: разбиваем и шлём по частям
-    if full_plain_message:
-        message = format_message(full_plain_message)
-        message = sanitize_html(message)
-        parts = split_message(message)
-        if parts:
-            await safe_send(
-                init_msg.edit_text,
-                text=parts[0],
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True,
-            )
-            for part in parts[1:]:
-                await safe_send(
-                    update.message.reply_text,
-                    text=part,
-                    parse_mode=ParseMode.HTML,
-                    disable_web_page_preview=True,
-                )
+    try:
+        await reply.consume(response)
+    except asyncio.CancelledError:
+        await reply.interrupt(SUPERSEDED_TEXT)
+        raise
+    finish_generation("chat", response, reply, started)
+    try:
+        chat.history = session.history
+    except Exception as e:
+        # Оборванный ответ в историю не попадает
+        logger.warning("Session %s not updated: %s", chat_id, e)
+        return
+    await session_store.save(chat_id, chat)
+    # Кэш ответов привязан к основной модели (PROMPT_VERSION), поэтому ответ
+    # резервной модели в него не кладём. Сравниваем с именем резервной: у модели
+    # из кэша Gemini имя может быть с версией ("...-001")
+    answered_by_fallback = (
+        fallback_model is not None and session.model.model_name == fallback_model.model_name
+    )
+    if not history and reply.text and not answered_by_fallback:
+        await response_cache.put(text, reply.text)
+    # Длинная история сжимается в фоне, чтобы следующие запросы не росли
+    history_compactor.maybe_compact(chat_id, context_tokens(response))
+    if reply.rest.strip():
+        context.chat_data["pages"] = paginate(reply.rest)
 
+@track_request
 async def handle_image(update: Update, _: ContextTypes.DEFAULT_TYPE) -> None:
-    init_msg = await safe_send(
-        update.message.reply_text,
-        text="Generating...", reply_to_message_id=update.message.message_id
-    )
-    images = update.message.photo
-    unique_images: dict = {}
-    for img in images:
-        file_id = img.file_id[:-7]
-        if file_id not in unique_images:
-            unique_images[file_id] = img
-        elif img.file_size > unique_images[file_id].file_size:
-            unique_images[file_id] = img
-    file_list = list(unique_images.values())
-    file = await file_list[0].get_file()
-    a_img = load_image.open(BytesIO(await file.download_as_bytearray()))
-    prompt = update.message.caption if update.message.caption else "Analyse this image and generate response"
-    response = await img_model.generate_content_async([prompt, a_img], stream=True)
-    full_plain_message = ""
-    async for chunk in response:
-        try:
-            if chunk.text:
-                full_plain_message += chunk.text
-        except Exception as e:
-            print(e)
-            continue
-        await asyncio.sleep(0.1)
-
-    if full_plain_message:
-        message = format_message(full_plain_message)
-        message = sanitize_html(message)
-        parts = split_message(message)
-        if parts:
-            await safe_send(
-                init_msg.edit_text,
-                text=parts[0],
-                parse_mode=ParseMode.HTML,
-                disable_web_page_preview=True,
+    received = time.monotonic()
+    chat_id = update.effective_chat.id
+    album = update.message.media_group_id
+    if album is not None and not album_buffer.add(album, update.message):
+        # Фото из альбома обработает первое сообщение этого альбома
+        return
+    turn = gemini_scheduler.reserve(chat_id)
+    init_msg = None
+    reply = None
+    try:
+        init_msg = await safe_send(
+            update.message.reply_text,
+            text="Generating...", reply_to_message_id=update.message.message_id
+        )
+        FIRST_REPLY.observe(time.monotonic() - received)
+        if turn.rejected is not None:
+            raise turn.rejected
+        generations.begin(chat_id)
+        # Все фото альбома уходят в модель одним запросом
+        messages = await album_buffer.collect(album) if album is not None else [update.message]
+        prompt = next(
+            (message.caption for message in messages if message.caption),
+            "Analyse this image and generate response",
+        )
+        # Уменьшенные копии из кэша или из фонового потока, не блокируя цикл событий
+        images = await asyncio.gather(*(load_photo(message.photo) for message in messages))
+        async with gemini_scheduler.slot(
+            chat_id, IMAGE_TOKENS * len(images), on_queued=queue_notifier(init_msg), turn=turn
+        ):
+            started = time.monotonic()
+            reply = StreamingReply(update, init_msg)
+            response = await gemini_client.call(
+                img_model, lambda bound: bound.generate_content_async([prompt, *images], stream=True)
             )
-            for part in parts[1:]:
-                await safe_send(
-                    update.message.reply_text,
-                    text=part,
-                    parse_mode=ParseMode.HTML,
-                    disable_web_page_preview=True,
-                )
+            await reply.consume(response)
+            finish_generation("image", response, reply, started)
+    except (Rejected, ResourceExhausted) as e:
+        await report_rejection(init_msg, e)
+    except asyncio.CancelledError:
+        if not generations.superseded():
+            raise
+        if reply is None:
+            await report_superseded(init_msg)
+        else:
+            await reply.interrupt(SUPERSEDED_TEXT)
+    finally:
+        gemini_scheduler.cancel(turn)
+        generations.end(chat_id)
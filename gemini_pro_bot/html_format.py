@@ -1,5 +1,29 @@
 import re
 
+# Inline markdown constructs. Each construct is a named group so the renderer
+# can dispatch on ``match.lastgroup``; contents never span lines.
+_INLINE_PATTERN = r"""
+    (?P<link>\[(?P<link_text>.*?)\]\((?P<link_url>.*?)\))
+  | \*\*(?P<bold>.*?)\*\*
+  | (?<!\*)\*(?!\*)(?P<italic>.*?)(?<!\*)\*(?!\*)
+  | __(?P<underline>.*?)__
+  | ~~(?P<strikethrough>.*?)~~
+  | (?<!`)`(?!`)(?P<monospace>.*?)(?<!`)`(?!`)
+"""
+
+# Block constructs anchored at line starts, followed by the inline ones.
+# A fence without a closing line leaves the rest of the text untouched.
+_BLOCK_PATTERN = r"""
+    (?P<code>^```(?P<code_lang>[^\n]*)\n(?P<code_body>(?:[^\n]*\n)*?)```(?P<code_tail>[^\n]*))
+  | (?P<open_code>^```[\s\S]*)
+  | (?P<header>^\#{1,6}[^\S\n]+(?P<header_text>[^\n]*))
+  | (?P<hand_point>^\*[^\S\n])
+  | """ + _INLINE_PATTERN
+
+_INLINE_RE = re.compile(_INLINE_PATTERN, re.VERBOSE)
+_BLOCK_RE = re.compile(_BLOCK_PATTERN, re.VERBOSE | re.MULTILINE)
+_LANG_RE = re.compile(r"\w*")
+
 
 def escape_html(text: str) -> str:
     """Escapes HTML special characters in a string.
@@ -19,167 +43,62 @@ def escape_html(text: str) -> str:
     return text
 
 
-def apply_hand_points(text: str) -> str:
-    """Replaces markdown bullet points (*) with right hand point emoji.
-
-    Arguments:
-    text (str): The text to modify.
-
-    Returns:
-    str: The text with markdown bullet points replaced with emoji.
-    """
-    pattern = r"(?<=\n)\*\s(?!\*)|^\*\s(?!\*)"
-
-    replaced_text = re.sub(pattern, "👉 ", text)
-
-    return replaced_text
-
-
-def apply_bold(text: str) -> str:
-    """Replaces markdown bold formatting with HTML bold tags.
-
-    Arguments:
-    text (str): The text to modify.
-
-    Returns:
-    str: The text with markdown bold replaced by HTML tags.
-    """
-    pattern = r"\*\*(.*?)\*\*"
-    replaced_text = re.sub(pattern, r"<b>\1</b>", text)
-    return replaced_text
-
-
-def apply_italic(text: str) -> str:
-    """Replaces markdown italic formatting with HTML italic tags.
-
-    Arguments:
-    text (str): The text to modify.
-
-    Returns:
-    str: The text with markdown italic replaced by HTML tags.
-    """
-    pattern = r"(?<!\*)\*(?!\*)(?!\*\*)(.*?)(?<!\*)\*(?!\*)"
-    replaced_text = re.sub(pattern, r"<i>\1</i>", text)
-    return replaced_text
-
-
-def apply_code(text: str) -> str:
-    """Replace markdown code blocks with HTML <pre> tags.
-
-    Arguments:
-    text (str): The text to modify.
-
-    Returns:
-    str: The text with markdown code blocks replaced by HTML tags.
-    """
-    pattern = r"```([\w]*?)\n([\s\S]*?)```"
-    replaced_text = re.sub(pattern, r"<pre lang='\1'>\2</pre>", text, flags=re.DOTALL)
-    return replaced_text
-
-
-def apply_monospace(text: str) -> str:
-    """Replaces markdown monospace backticks with HTML <code> tags.
-
-    Arguments:
-    text (str): The input text containing markdown monospace formatting.
-
-    Returns:
-    str: The text with monospace sections replaced with HTML tags.
-    """
-    pattern = r"(?<!`)`(?!`)(.*?)(?<!`)`(?!`)"
-    replaced_text = re.sub(pattern, r"<code>\1</code>", text)
-    return replaced_text
-
-
-def apply_link(text: str) -> str:
-    """Replace markdown links with HTML anchor tags.
-
-    Arguments:
-    text (str): The input text containing markdown links.
-
-    Returns:
-    str: The text with markdown links replaced by HTML anchor tags.
-    """
-    pattern = r"\[(.*?)\]\((.*?)\)"
-    replaced_text = re.sub(pattern, r'<a href="\2">\1</a>', text)
-    return replaced_text
-
-
-def apply_underline(text: str) -> str:
-    """Replace markdown underline with HTML underline tags.
+def _render_inline(match: re.Match) -> str:
+    """Render one inline markdown construct as Telegram HTML.
 
     Arguments:
-    text (str): The input text to modify.
+    match (re.Match): A match of one of the inline constructs.
 
     Returns:
-    str: The text with markdown underlines replaced with HTML tags."""
-    pattern = r"__(.*?)__"
-    replaced_text = re.sub(pattern, r"<u>\1</u>", text)
-    return replaced_text
-
-
-def apply_strikethrough(text: str) -> str:
-    """Replace markdown strikethrough with HTML strikethrough tags.
-
-    Arguments:
-    text (str): The input text to modify.
-
-    Returns:
-    str: The text with markdown strikethroughs replaced with HTML tags.
+    str: The HTML for the construct. Nested formatting is rendered
+    recursively, except inside links' URLs and monospace spans.
     """
-    pattern = r"~~(.*?)~~"
-    replaced_text = re.sub(pattern, r"<s>\1</s>", text)
-    return replaced_text
-
-
-def apply_header(text: str) -> str:
-    """Replace markdown header # with HTML header tags.
+    kind = match.lastgroup
+    if kind == "link":
+        text = _INLINE_RE.sub(_render_inline, match["link_text"])
+        return f'<a href="{match["link_url"]}">{text}</a>'
+    if kind == "monospace":
+        return f"<code>{match['monospace']}</code>"
+    inner = _INLINE_RE.sub(_render_inline, match[kind])
+    if kind == "bold":
+        return f"<b>{inner}</b>"
+    if kind == "italic":
+        return f"<i>{inner}</i>"
+    if kind == "underline":
+        return f"<u>{inner}</u>"
+    return f"<s>{inner}</s>"
+
+
+def _render_block(match: re.Match) -> str:
+    """Render one block or inline markdown construct as Telegram HTML.
 
     Arguments:
-    text (str): The input text to modify.
+    match (re.Match): A match of ``_BLOCK_RE``.
 
     Returns:
-    str: The text with markdown headers replaced with HTML tags.
+    str: The HTML for the construct.
     """
-    pattern = r"^(#{1,6})\s+(.*)"
-    replaced_text = re.sub(pattern, r"<b><u>\2</u></b>", text, flags=re.DOTALL)
-    return replaced_text
-
-
-def apply_exclude_code(text: str) -> str:
-    """Apply text formatting to non-code lines.
-
-    Iterates through each line, checking if it is in a code block.
-    If not, applies header, link, bold, italic, underline, strikethrough, monospace, and hand-point
-    text formatting.
-    """
-    lines = text.split("\n")
-    in_code_block = False
-
-    for i, line in enumerate(lines):
-        if line.startswith("```"):
-            in_code_block = not in_code_block
-
-        if not in_code_block:
-            formatted_line = lines[i]
-            formatted_line = apply_header(formatted_line)
-            formatted_line = apply_link(formatted_line)
-            formatted_line = apply_bold(formatted_line)
-            formatted_line = apply_italic(formatted_line)
-            formatted_line = apply_underline(formatted_line)
-            formatted_line = apply_strikethrough(formatted_line)
-            formatted_line = apply_monospace(formatted_line)
-            formatted_line = apply_hand_points(formatted_line)
-            lines[i] = formatted_line
-
-    return "\n".join(lines)
+    kind = match.lastgroup
+    if kind == "code":
+        lang = _LANG_RE.match(match["code_lang"])[0]
+        tail = _INLINE_RE.sub(_render_inline, match["code_tail"])
+        return f"<pre lang='{lang}'>{match['code_body']}</pre>{tail}"
+    if kind == "open_code":
+        return match[kind]
+    if kind == "header":
+        text = _INLINE_RE.sub(_render_inline, match["header_text"])
+        return f"<b><u>{text}</u></b>"
+    if kind == "hand_point":
+        return "👉 "
+    return _render_inline(match)
 
 
 def format_message(text: str) -> str:
     """Format the given message text from markdown to HTML.
 
-    Escapes HTML characters, applies link, code, and other rich text formatting,
-    and returns the formatted HTML string.
+    Escapes HTML characters, then renders headers, links, bold, italic,
+    underline, strikethrough, monospace, bullet points and fenced code
+    blocks in a single scan with precompiled patterns.
 
     Args:
       message (str): The plain text message to format.
@@ -187,7 +106,4 @@ def format_message(text: str) -> str:
     Returns:
       str: The formatted HTML string.
     """
-    formatted_text = escape_html(text)
-    formatted_text = apply_exclude_code(formatted_text)
-    formatted_text = apply_code(formatted_text)
-    return formatted_text
+    return _BLOCK_RE.sub(_render_block, escape_html(text))
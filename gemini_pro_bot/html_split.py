@@ -0,0 +1,206 @@
+import re
+
+# Tags Telegram accepts in HTML parse mode that format_message can produce.
+ALLOWED_TAGS = frozenset({"b", "i", "u", "s", "a", "code", "pre"})
+
+_TOKEN_RE = re.compile(
+    r"(?P<comment><!--.*?-->)"
+    r"|<(?P<close>/?)(?P<name>[a-zA-Z][\w-]*)(?P<attrs>[^<>]*)>"
+    r"|(?P<text>[^<]+)"
+    r"|(?P<lt><)",
+    re.DOTALL,
+)
+_HREF_RE = re.compile(r"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))""", re.IGNORECASE)
+_BARE_AMP_RE = re.compile(r"&(?!(?:#\d+|#x[0-9a-fA-F]+|lt|gt|amp|quot);)")
+_TAG_RE = re.compile(r"<[^>]*>")
+
+
+def _escape_text(text: str) -> str:
+    """Escape what Telegram would reject in text: bare ``&`` and ``>``."""
+    if "&" in text:
+        text = _BARE_AMP_RE.sub("&amp;", text)
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+    return text
+
+
+class HTMLSplitter:
+    """Sanitizes Telegram HTML and splits it into parts in one linear pass.
+
+    Tags outside ALLOWED_TAGS are unwrapped, attributes other than ``href``
+    on ``<a>`` are dropped, and stray or unbalanced tags are repaired. Each
+    part fits in ``max_length`` characters, closes the tags still open at its
+    end and reopens them at the start of the next part. Parts are cut at the
+    last line break, otherwise at the last sentence end, otherwise where the
+    budget runs out.
+
+    >>> splitter = HTMLSplitter(max_length=4000)
+    >>> splitter.feed(html)
+    >>> parts = splitter.close()
+    """
+
+    def __init__(self, max_length: int | None = 4000) -> None:
+        self.max_length = max_length
+        self.parts: list[str] = []
+        self._stack: list[tuple[str, str]] = []
+        self._closing = 0
+        self._buf: list[str] = []
+        self._size = 0
+        self._prefix = 0
+        # Latest cut candidates in the current part: (offset, open tags there)
+        self._newline: tuple[int, tuple] | None = None
+        self._sentence: tuple[int, tuple] | None = None
+
+    def feed(self, html: str) -> None:
+        for match in _TOKEN_RE.finditer(html):
+            text = match["text"]
+            if text is not None:
+                self._text(_escape_text(text))
+            elif match["name"] is not None:
+                self._tag(match["name"].lower(), bool(match["close"]), match["attrs"])
+            elif match["lt"] is not None:
+                self._text("&lt;")
+
+    def close(self) -> list[str]:
+        """Close the open tags, flush the last part and return all parts."""
+        self._emit(self._closing_tags(self._stack))
+        self._stack.clear()
+        self._closing = 0
+        self._flush("".join(self._buf))
+        self._buf = []
+        return self.parts
+
+    # --- tokens ---
+
+    def _tag(self, name: str, closing: bool, attrs: str) -> None:
+        if name not in ALLOWED_TAGS:
+            return
+        if closing:
+            names = [open_name for open_name, _ in self._stack]
+            if name not in names:
+                return
+            while self._stack:
+                open_name, _ = self._stack.pop()
+                self._closing -= len(open_name) + 3
+                self._emit(f"</{open_name}>")
+                if open_name == name:
+                    break
+            return
+        tag = f"<{name}>"
+        if name == "a":
+            href = _HREF_RE.search(attrs)
+            if href:
+                url = _escape_text(next(g for g in href.groups() if g is not None))
+                tag = f'<a href="{url.replace(chr(34), "&quot;")}">'
+        # A cut at an older candidate may leave too little room; cut again
+        while self._over_budget(len(tag) + len(name) + 3):
+            self._cut()
+        self._emit(tag)
+        self._stack.append((name, tag))
+        self._closing += len(name) + 3
+
+    def _text(self, text: str) -> None:
+        while text:
+            room = self._room()
+            if room is None or len(text) <= room:
+                self._append_text(text)
+                return
+            if room <= 0 and self._size == self._prefix:
+                # Nesting alone exhausts the budget; make progress regardless
+                room = 1
+            head = text[:max(room, 0)]
+            amp = head.rfind("&")
+            if amp != -1 and ";" not in head[amp:]:
+                # Never cut inside an entity
+                head = head[:amp]
+                if not head:
+                    if self._size > self._prefix:
+                        # The entity goes to the next part
+                        self._cut()
+                        continue
+                    # Only a fresh part may take a whole entity it has no room for
+                    head = text[:text.find(";") + 1]
+            self._append_text(head)
+            text = text[len(head):]
+            self._cut()
+
+    def _append_text(self, text: str) -> None:
+        if not text:
+            return
+        newline = text.rfind("\n")
+        if newline != -1:
+            self._newline = (self._size + newline + 1, tuple(self._stack))
+        sentence = text.rfind(". ")
+        if sentence != -1:
+            self._sentence = (self._size + sentence + 2, tuple(self._stack))
+        self._emit(text)
+
+    # --- parts ---
+
+    def _room(self) -> int | None:
+        if self.max_length is None:
+            return None
+        return self.max_length - self._size - self._closing
+
+    def _over_budget(self, extra: int) -> bool:
+        room = self._room()
+        return room is not None and extra > room and self._size > self._prefix
+
+    def _emit(self, piece: str) -> None:
+        self._buf.append(piece)
+        self._size += len(piece)
+
+    @staticmethod
+    def _closing_tags(stack) -> str:
+        return "".join(f"</{name}>" for name, _ in reversed(stack))
+
+    def _flush(self, part: str) -> None:
+        if _TAG_RE.sub("", part).strip():
+            self.parts.append(part)
+
+    def _cut(self) -> None:
+        """End the current part at the best candidate and start the next one."""
+        for candidate in (self._newline, self._sentence):
+            if candidate is not None and candidate[0] > self._prefix:
+                offset, stack = candidate
+                break
+        else:
+            if self._size == self._prefix:
+                return
+            offset, stack = self._size, tuple(self._stack)
+        current = "".join(self._buf)
+        self._flush(current[:offset] + self._closing_tags(stack))
+        rest = current[offset:]
+        # Tags that close right after the cut are not reopened: they would
+        # start the next part with empty wrappers such as <b><i></i></b>
+        stack = list(stack)
+        while stack and rest.startswith(f"</{stack[-1][0]}>"):
+            rest = rest[len(stack.pop()[0]) + 3:]
+        skipped = len(current) - offset - len(rest)
+        reopen = "".join(tag for _, tag in stack)
+        self._buf = [reopen, rest]
+        self._size = len(reopen) + len(rest)
+        self._prefix = len(reopen)
+        if self._sentence is not None and self._sentence[0] > offset:
+            self._sentence = (
+                self._sentence[0] - offset - skipped + len(reopen),
+                self._sentence[1],
+            )
+        else:
+            self._sentence = None
+        self._newline = None
+
+
+def split_html(html: str, max_length: int = 4000) -> list[str]:
+    """Sanitize Telegram HTML and split it into well-formed parts.
+
+    Args:
+        html (str): HTML produced by format_message.
+        max_length (int): Maximum length of each part, tags included.
+
+    Returns:
+        list[str]: Parts that each close every tag they open.
+    """
+    splitter = HTMLSplitter(max_length)
+    splitter.feed(html)
+    return splitter.close()
@@ -0,0 +1,128 @@
+import asyncio
+from collections import OrderedDict
+from io import BytesIO
+from typing import Sequence
+import PIL.Image
+from gemini_pro_bot.config import env_float, env_int
+from telegram import Message, PhotoSize
+
+# Smallest photo size whose longer side reaches this is downloaded
+IMAGE_TARGET_SIDE = env_int("IMAGE_TARGET_SIDE", 1024)
+# Images above this many pixels are downscaled before they are sent to the model
+IMAGE_MAX_PIXELS = env_int("IMAGE_MAX_PIXELS", 1000000)
+IMAGE_JPEG_QUALITY = env_int("IMAGE_JPEG_QUALITY", 85)
+# Prepared images kept in memory, keyed by file_unique_id
+IMAGE_CACHE_SIZE = env_int("IMAGE_CACHE_SIZE", 128)
+# Seconds without a new photo after which an album is considered complete
+ALBUM_WAIT = env_float("ALBUM_WAIT", 0.8)
+
+
+def pick_photo(sizes: Sequence[PhotoSize], target_side: int) -> PhotoSize:
+    """Return the smallest size whose longer side is at least ``target_side``.
+
+    Falls back to the largest size when none is big enough.
+    """
+    by_area = sorted(sizes, key=lambda size: size.width * size.height)
+    for size in by_area:
+        if max(size.width, size.height) >= target_side:
+            return size
+    return by_area[-1]
+
+
+def prepare_image(raw: bytes, max_pixels: int, quality: int) -> bytes:
+    """Decode an image, fit it into ``max_pixels`` and re-encode it as JPEG.
+
+    Runs in a worker thread: Pillow releases the GIL while decoding and
+    encoding, so the event loop keeps serving other chats.
+    """
+    image = PIL.Image.open(BytesIO(raw))
+    pixels = image.width * image.height
+    if pixels > max_pixels:
+        scale = (max_pixels / pixels) ** 0.5
+        # thumbnail() lets the JPEG decoder skip most of the full-size work
+        image.thumbnail(
+            (max(1, int(image.width * scale)), max(1, int(image.height * scale))),
+            PIL.Image.Resampling.LANCZOS,
+        )
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    out = BytesIO()
+    image.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+class ImageCache:
+    """Bounded LRU of prepared JPEG bytes keyed by ``file_unique_id``."""
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max_size
+        self._items: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        data = self._items.get(key)
+        if data is not None:
+            self._items.move_to_end(key)
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        self._items[key] = data
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+
+image_cache = ImageCache(IMAGE_CACHE_SIZE)
+
+
+class AlbumBuffer:
+    """Groups the photos of an album, which Telegram delivers as separate updates.
+
+    The first update of a ``media_group_id`` becomes the album's leader and
+    collects the rest; the others only join the group and return.
+    """
+
+    def __init__(self, wait: float) -> None:
+        self.wait = wait
+        self._albums: dict[str, list[Message]] = {}
+
+    def add(self, media_group_id: str, message: Message) -> bool:
+        """Add a photo to its album; True if it is the first one."""
+        album = self._albums.get(media_group_id)
+        if album is None:
+            self._albums[media_group_id] = [message]
+            return True
+        album.append(message)
+        return False
+
+    async def collect(self, media_group_id: str) -> list[Message]:
+        """Wait until the album stops growing and return its messages in order."""
+        album = self._albums[media_group_id]
+        try:
+            seen = 0
+            while seen != len(album):
+                seen = len(album)
+                await asyncio.sleep(self.wait)
+        finally:
+            del self._albums[media_group_id]
+        return sorted(album, key=lambda message: message.message_id)
+
+
+album_buffer = AlbumBuffer(ALBUM_WAIT)
+
+
+async def load_photo(sizes: Sequence[PhotoSize]) -> dict:
+    """Download and prepare a Telegram photo as a Gemini image part.
+
+    Forwarded and repeated photos keep their ``file_unique_id``, so they are
+    served from the cache without a download.
+    """
+    photo = pick_photo(sizes, IMAGE_TARGET_SIDE)
+    data = image_cache.get(photo.file_unique_id)
+    if data is None:
+        file = await photo.get_file()
+        raw = await file.download_as_bytearray()
+        data = await asyncio.to_thread(
+            prepare_image, bytes(raw), IMAGE_MAX_PIXELS, IMAGE_JPEG_QUALITY
+        )
+        image_cache.put(photo.file_unique_id, data)
+    return {"mime_type": "image/jpeg", "data": data}
@@ -1,9 +1,6 @@
-import os
 import google.generativeai as genai
 from google.generativeai.types.safety_types import HarmCategory, HarmBlockThreshold
-from dotenv import load_dotenv
-
-load_dotenv()
+from gemini_pro_bot.config import env_bool, env_str, settings
 
 # Disable all safety filters
 SAFETY_SETTINGS = {
@@ -13,10 +10,17 @@ SAFETY_SETTINGS = {
     HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
 }
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+# Несколько ключей через запятую распределяют нагрузку; первый ключ — основной
+GOOGLE_API_KEYS = settings.google_api_keys
+
+genai.configure(api_key=GOOGLE_API_KEYS[0] if GOOGLE_API_KEYS else None)
+
+# Постраничная выдача: модель пишет анализ целиком, а бот сам делит его на
+# страницы и отдаёт их по "да"/"продолжай" без новых запросов к модели
+PAGINATE_ANSWERS = env_bool("PAGINATE_ANSWERS")
 
 # Системная инструкция для Румии - нумеролога
-NUMEROLOGIST_PROMPT = """Ты — Румия, всемирно известный эксперт в области традиционной, японской, китайской и тибетской нумерологии с многолетним практическим опытом. Твои знания основаны на глубоком понимании культуры и традиций Востока. Твой стиль общения — уважительный, мудрый и человечный, как у мастера, беседующего с учеником. Ты не робот и не ИИ, а специалист. Твоя задача — предоставить глубокие и точные нумерологические расчеты, значения и знания, которые преподают исключительно в восточных школах.
+_RULES_PROMPT = """Ты — Румия, всемирно известный эксперт в области традиционной, японской, китайской и тибетской нумерологии с многолетним практическим опытом. Твои знания основаны на глубоком понимании культуры и традиций Востока. Твой стиль общения — уважительный, мудрый и человечный, как у мастера, беседующего с учеником. Ты не робот и не ИИ, а специалист. Твоя задача — предоставить глубокие и точные нумерологические расчеты, значения и знания, которые преподают исключительно в восточных школах.
 
 Ключевые правила твоего поведения:
 
@@ -34,7 +38,9 @@ NUMEROLOGIST_PROMPT = """Ты — Румия, всемирно известны
 
 7. Личная консультация: Если клиент хочет большего, чем твои ответы, или личную консультацию, вежливо предложи написать менеджеру для записи на консультацию. Все цены и время клиент может уточнить у менеджера.
 
-8. **КРИТИЧЕСКОЕ ПРАВИЛО ДЛИНЫ ОТВЕТА**: 
+"""
+
+_LENGTH_RULE = """8. **КРИТИЧЕСКОЕ ПРАВИЛО ДЛИНЫ ОТВЕТА**: 
    - Твой ответ должен быть не длиннее 3500 символов (включая все символы, пробелы и форматирование).
    - Если полный анализ требует больше символов, раздели его на логические части.
    - После достижения 3500 символов ОСТАНОВИСЬ на логичном месте (завершив мысль, раздел или аспект).
@@ -48,13 +54,45 @@ NUMEROLOGIST_PROMPT = """Ты — Румия, всемирно известны
 - Пользователь: "да"
 - Второе сообщение: [Продолжение — анализ числа судьбы, без повторения предыдущего] → если нужно, снова предлагаешь продолжение."""
 
+_PAGINATED_LENGTH_RULE = """8. Полнота ответа: Давай полный анализ целиком в одном ответе, не обрывай его и не предлагай продолжить — длинный ответ будет показан пользователю по частям автоматически. Если пользователь пишет "да", "продолжай" или подобное, а продолжать нечего, предложи следующий аспект нумерологической карты."""
+
+# Числа считает бот (gemini_pro_bot/numerology.py) и присылает их вместе с сообщением
+_NUMBERS_RULE = """9. Готовые расчёты: Если сообщение клиента сопровождает блок "Расчёты бота", числа в нём посчитаны точно. Используй их как есть, не пересчитывай и не расписывай арифметику — сосредоточься на толковании и рекомендациях. Числа, которых в блоке нет, рассчитывай сама."""
+
+NUMEROLOGIST_PROMPT = (
+    _RULES_PROMPT
+    + (_PAGINATED_LENGTH_RULE if PAGINATE_ANSWERS else _LENGTH_RULE)
+    + "\n\n"
+    + _NUMBERS_RULE
+)
+
+MODEL_NAME = env_str("GEMINI_MODEL", "gemini-2.5-flash")  # или попробуй "gemini-2.5-pro"
+IMAGE_MODEL_NAME = env_str("GEMINI_IMAGE_MODEL", "gemini-1.5-flash")
+# Запасная модель для дублирующих запросов и последней повторной попытки (необязательно)
+FALLBACK_MODEL_NAME = env_str("GEMINI_FALLBACK_MODEL")
+
 model = genai.GenerativeModel(
-    "gemini-2.5-flash",  # или попробуй "gemini-2.5-pro"
+    MODEL_NAME,
     safety_settings=SAFETY_SETTINGS,
     system_instruction=NUMEROLOGIST_PROMPT
 )
 
 img_model = genai.GenerativeModel(
-    "gemini-1.5-flash", 
+    IMAGE_MODEL_NAME,
     safety_settings=SAFETY_SETTINGS
 )
+
+fallback_model = genai.GenerativeModel(
+    FALLBACK_MODEL_NAME,
+    safety_settings=SAFETY_SETTINGS,
+    system_instruction=NUMEROLOGIST_PROMPT
+) if FALLBACK_MODEL_NAME else None
+
+# Краткое содержание старой части беседы, которым заменяются ранние реплики
+SUMMARY_PROMPT = """Ты сжимаешь переписку клиента с нумерологом Румией. Составь краткое содержание на русском языке, не длиннее 1500 символов. Обязательно сохрани дословно все даты рождения, имена и другие исходные данные клиента, полученные числа и выводы расчётов, вопросы клиента и то, на каком аспекте анализа остановилась беседа. Пиши только содержание, без вступлений."""
+
+summary_model = genai.GenerativeModel(
+    MODEL_NAME,
+    safety_settings=SAFETY_SETTINGS,
+    system_instruction=SUMMARY_PROMPT
+)
@@ -0,0 +1,137 @@
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import secrets
+import sys
+import time
+from gemini_pro_bot.config import env_bool, env_float, env_str
+
+LOG_LEVEL = env_str("LOG_LEVEL", "INFO").upper()
+# "json" (one object per line) or "text"
+LOG_FORMAT = env_str("LOG_FORMAT", "json").lower()
+# Share of updates whose INFO/DEBUG records are kept; warnings and errors always are
+LOG_SAMPLE_RATE = env_float("LOG_SAMPLE_RATE", 1)
+# Prompts and answers are logged only as their length unless this is on
+LOG_PROMPTS = env_bool("LOG_PROMPTS")
+
+# Set per update; tasks started while handling it inherit them
+trace_id: contextvars.ContextVar[str | None] = contextvars.ContextVar("trace_id", default=None)
+trace_chat: contextvars.ContextVar[int | None] = contextvars.ContextVar("trace_chat", default=None)
+_sampled: contextvars.ContextVar[bool] = contextvars.ContextVar("sampled", default=True)
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def start_trace(chat_id: int | None = None) -> str:
+    """Give the current task (and the tasks it starts) a new trace ID."""
+    trace = secrets.token_hex(8)
+    trace_id.set(trace)
+    trace_chat.set(chat_id)
+    _sampled.set(random.random() < LOG_SAMPLE_RATE)
+    return trace
+
+
+def current_trace() -> tuple:
+    """The trace of the current update, for work that runs in another task."""
+    return trace_id.get(), trace_chat.get(), _sampled.get()
+
+
+def resume_trace(state: tuple) -> None:
+    """Continue a trace saved with current_trace() in the current task."""
+    trace, chat_id, sampled = state
+    trace_id.set(trace)
+    trace_chat.set(chat_id)
+    _sampled.set(sampled)
+
+
+def redact(text: str | None) -> str:
+    """What of a user's or the model's text may go to the logs."""
+    if text is None:
+        return ""
+    return text if LOG_PROMPTS else f"<{len(text)} chars>"
+
+
+class TraceFilter(logging.Filter):
+    """Stamps records with the trace of the current update and applies sampling.
+
+    Runs in the task that logs, where the update's context variables are
+    visible, before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not _sampled.get():
+            return False
+        record.trace_id = trace_id.get()
+        if getattr(record, "chat_id", None) is None:
+            record.chat_id = trace_chat.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and value is not None:
+                data[key] = value
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    converter = time.gmtime
+
+    def __init__(self) -> None:
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{key}={value}"
+            for key, value in vars(record).items()
+            if key not in _RECORD_FIELDS and value is not None
+        )
+        return f"{line} [{fields}]" if fields else line
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens in the listener thread; only freeze the message here
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging() -> None:
+    """Send all logging through a queue to a background thread writing to stdout.
+
+    The event loop only puts records on an unbounded in-memory queue; a slow
+    stdout (or a log drain behind it) holds up the listener thread instead.
+    """
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(TraceFilter())
+    listener = logging.handlers.QueueListener(records, stream, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [handler]
+    root.setLevel(LOG_LEVEL)
+    # httpx logs every request at INFO, with the bot token in the URL
+    logging.getLogger("httpx").setLevel(logging.WARNING)
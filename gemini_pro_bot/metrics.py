@@ -0,0 +1,80 @@
+import functools
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+# Seconds, from tens of milliseconds up to a long generation
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60, 120)
+# Milliseconds-scale CPU work such as formatting a reply
+RENDER_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+
+UPDATE_DELAY = Histogram(
+    "bot_update_delay_seconds",
+    "Time from the message's Telegram timestamp until a handler receives it",
+    buckets=LATENCY_BUCKETS,
+)
+FIRST_REPLY = Histogram(
+    "bot_first_reply_seconds",
+    "Time from a handler starting until its first reply message is sent",
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_FIRST_CHUNK = Histogram(
+    "bot_gemini_first_chunk_seconds",
+    "Time from sending a Gemini request until its first streamed chunk",
+    ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_STREAM = Histogram(
+    "bot_gemini_stream_seconds",
+    "Time from sending a Gemini request until its stream is consumed",
+    ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+RENDER = Histogram(
+    "bot_render_seconds",
+    "Time spent turning model markdown into Telegram messages",
+    ["stage"],
+    buckets=RENDER_BUCKETS,
+)
+TELEGRAM_SEND = Histogram(
+    "bot_telegram_send_seconds",
+    "Latency of Telegram send and edit calls",
+    ["method"],
+    buckets=LATENCY_BUCKETS,
+)
+ERRORS = Counter(
+    "bot_errors_total",
+    "Errors while handling updates, by type",
+    ["type"],
+)
+GEMINI_ATTEMPTS = Counter(
+    "bot_gemini_attempts_total",
+    "Extra Gemini attempts: retries, hedged requests and hedges that answered first",
+    ["kind"],
+)
+GEMINI_TOKENS = Counter(
+    "bot_gemini_tokens_total",
+    "Gemini tokens by request kind; input includes the cached tokens",
+    ["kind", "type"],
+)
+IN_FLIGHT = Gauge(
+    "bot_requests_in_flight",
+    "Text and image requests currently being handled",
+)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return the exposition body and its content type for /metrics."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def track_request(handler):
+    """Count a handler as in flight and observe how late its update arrived."""
+
+    @functools.wraps(handler)
+    async def wrapper(update, context):
+        with IN_FLIGHT.track_inprogress():
+            if update.message is not None:
+                UPDATE_DELAY.observe(max(0.0, time.time() - update.message.date.timestamp()))
+            return await handler(update, context)
+
+    return wrapper
@@ -0,0 +1,279 @@
+import asyncio
+import copy
+import logging
+import random
+import time
+import weakref
+from collections import deque
+from gemini_pro_bot.config import env_bool, env_float, env_int
+from google.ai import generativelanguage as glm
+from google.api_core.exceptions import ServerError, TooManyRequests
+from gemini_pro_bot.llm import GOOGLE_API_KEYS, model
+from gemini_pro_bot.metrics import GEMINI_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+# Extra attempts after a 429 or 5xx, each on the next healthy key
+GEMINI_RETRIES = env_int("GEMINI_RETRIES", 2)
+GEMINI_RETRY_DELAY = 1.0
+# A key that fails this many times in a row is skipped for CIRCUIT_COOLDOWN seconds
+CIRCUIT_FAILURES = env_int("CIRCUIT_FAILURES", 5)
+CIRCUIT_COOLDOWN = env_float("CIRCUIT_COOLDOWN", 30)
+# A key that answered 429 rests this long
+KEY_QUOTA_COOLDOWN = 30.0
+# Hedging: a second request starts when the first chunk is later than the
+# p95 of recent first-chunk latencies (never earlier than HEDGE_MIN_DELAY)
+HEDGE = env_bool("HEDGE")
+HEDGE_MIN_DELAY = env_float("HEDGE_MIN_DELAY", 2)
+HEDGE_SAMPLES = 200
+# Seconds the startup warm-up may spend on one key
+WARM_UP_TIMEOUT = 10.0
+
+RETRYABLE = (TooManyRequests, ServerError)
+
+
+class ApiKey:
+    """One Gemini API key with its own client, health and circuit state."""
+
+    def __init__(self, index: int, key: str) -> None:
+        self.index = index
+        self.key = key
+        self.in_flight = 0
+        self.failures = 0
+        self.unavailable_until = 0.0
+        self._client = None
+
+    @property
+    def client(self):
+        # Created lazily: the gRPC channel belongs to the running event loop
+        if self._client is None:
+            self._client = glm.GenerativeServiceAsyncClient(client_options={"api_key": self.key})
+        return self._client
+
+    def available(self, now: float) -> bool:
+        return now >= self.unavailable_until
+
+    def succeeded(self) -> None:
+        self.failures = 0
+
+    def failed(self, error: Exception) -> None:
+        now = time.monotonic()
+        if isinstance(error, TooManyRequests):
+            self.unavailable_until = max(self.unavailable_until, now + KEY_QUOTA_COOLDOWN)
+            return
+        self.failures += 1
+        if self.failures >= CIRCUIT_FAILURES:
+            # Open the circuit; after the cooldown one request probes the key
+            self.unavailable_until = now + CIRCUIT_COOLDOWN
+            self.failures = CIRCUIT_FAILURES - 1
+            logger.warning("API key #%s disabled for %.0fs: %s", self.index, CIRCUIT_COOLDOWN, error)
+
+
+class KeyPool:
+    """Hands out the least busy healthy key.
+
+    When every key is cooling down, the one that recovers first is tried
+    anyway: refusing outright would turn a single 429 on a one-key pool
+    into a long outage.
+    """
+
+    def __init__(self, keys: list[str]) -> None:
+        self.keys = [ApiKey(index, key) for index, key in enumerate(keys)]
+
+    def acquire(self, exclude=()) -> ApiKey:
+        now = time.monotonic()
+        healthy = [key for key in self.keys if key.available(now)]
+        if not healthy:
+            return min(self.keys, key=lambda key: key.unavailable_until)
+        candidates = [key for key in healthy if key not in exclude] or healthy
+        return min(candidates, key=lambda key: (key.in_flight, key.failures))
+
+
+class LatencyTracker:
+    """Recent first-chunk latencies per model."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._samples: dict[str, deque[float]] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self._samples.setdefault(name, deque(maxlen=self.size)).append(seconds)
+
+    def p95(self, name: str) -> float | None:
+        samples = self._samples.get(name)
+        if not samples or len(samples) < 20:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(len(ordered) * 0.95) - 1]
+
+
+class GeminiClient:
+    """Runs model requests over a pool of API keys.
+
+    ``request`` is a function of a model bound to one key that returns an
+    awaitable, e.g. ``lambda m: m.generate_content_async(parts, stream=True)``;
+    for streams it completes with the first chunk. Failed attempts with a
+    429 or 5xx are retried on another key after a jittered exponential
+    backoff; the last retry uses the ``fallback`` model if one is given.
+    With hedging, a second attempt (fallback model or another key) starts
+    when the first chunk is late, and the first one to answer wins.
+
+    Cached content belongs to the key that created it (the first one), so
+    other keys get ``uncached`` instead of a model built from a cache.
+    """
+
+    def __init__(self, pool: KeyPool, uncached, retries=2, hedge=False) -> None:
+        self.pool = pool
+        self.uncached = uncached
+        self.retries = retries
+        self.hedge = hedge
+        self.latency = LatencyTracker(HEDGE_SAMPLES)
+        self._bound: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._warm_up: asyncio.Task | None = None
+
+    async def call(self, base_model, request, fallback=None, hedge: bool = True):
+        """Run ``request`` until one attempt succeeds and return its result.
+
+        Pass ``hedge=False`` for requests that are not streams: their
+        latency says nothing about the time to the first chunk.
+        """
+        tried: list[ApiKey] = []
+        for attempt in range(self.retries + 1):
+            current = fallback if attempt and attempt == self.retries and fallback else base_model
+            key = self.pool.acquire(exclude=tried)
+            tried.append(key)
+            try:
+                if hedge and self.hedge:
+                    return await self._hedged(current, fallback, key, request, tried)
+                return await self._attempt(current, key, request, track=hedge)
+            except RETRYABLE as e:
+                if attempt == self.retries:
+                    raise
+                GEMINI_ATTEMPTS.labels("retry").inc()
+                delay = GEMINI_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning("Gemini request failed (%s), retry in %.1fs", type(e).__name__, delay)
+                await asyncio.sleep(delay)
+
+    def warm_up(self, base_model) -> None:
+        """Open the connection of every key in the background.
+
+        A tiny count_tokens request per key pays for the channel and TLS
+        setup before the first user needs it; failures only mean the first
+        real request pays instead.
+        """
+        self._warm_up = asyncio.get_running_loop().create_task(self._warm_up_keys(base_model))
+
+    async def _warm_up_keys(self, base_model) -> None:
+        started = time.monotonic()
+
+        async def ping(key: ApiKey) -> None:
+            try:
+                await asyncio.wait_for(
+                    self.bind(base_model, key).count_tokens_async("ping"), WARM_UP_TIMEOUT
+                )
+            except Exception as e:
+                logger.info("Warm-up of API key #%s failed: %s", key.index, type(e).__name__)
+
+        await asyncio.gather(*(ping(key) for key in self.pool.keys))
+        logger.info("Gemini clients warmed up", extra={"seconds": round(time.monotonic() - started, 3)})
+
+    def bind(self, base_model, key: ApiKey):
+        """The model as seen through one API key."""
+        if key.index and base_model.cached_content is not None:
+            base_model = self.uncached
+        if len(self.pool.keys) == 1:
+            return base_model
+        bound = self._bound.setdefault(base_model, {})
+        if key.index not in bound:
+            clone = copy.copy(base_model)
+            clone._async_client = key.client
+            bound[key.index] = clone
+        return bound[key.index]
+
+    async def _attempt(self, base_model, key: ApiKey, request, track: bool = True):
+        bound = self.bind(base_model, key)
+        started = time.monotonic()
+        key.in_flight += 1
+        try:
+            result = await request(bound)
+        except RETRYABLE as e:
+            key.failed(e)
+            raise
+        finally:
+            key.in_flight -= 1
+        key.succeeded()
+        elapsed = time.monotonic() - started
+        if track:
+            self.latency.add(bound.model_name, elapsed)
+        logger.debug(
+            "Gemini call answered",
+            extra={"model": bound.model_name, "key": key.index, "seconds": round(elapsed, 3)},
+        )
+        return result
+
+    async def _hedged(self, base_model, fallback, key: ApiKey, request, tried: list[ApiKey]):
+        threshold = self.latency.p95(base_model.model_name)
+        delay = max(HEDGE_MIN_DELAY, threshold or 0.0)
+        first = asyncio.ensure_future(self._attempt(base_model, key, request))
+        attempts = [first]
+        winner = None
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done:
+                winner = first
+                return first.result()
+
+            second_model = fallback or base_model
+            second_key = self.pool.acquire(exclude=tried)
+            if second_key is key and second_model is base_model:
+                # Nothing different to race against
+                winner = first
+                return await first
+            GEMINI_ATTEMPTS.labels("hedge").inc()
+            second = asyncio.ensure_future(self._attempt(second_model, second_key, request))
+            attempts.append(second)
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if first in succeeded:
+                    winner = first
+                    return first.result()
+                if succeeded:
+                    GEMINI_ATTEMPTS.labels("hedge_won").inc()
+                    winner = second
+                    return second.result()
+            # Both failed: report the first request's error
+            return first.result()
+        finally:
+            # The loser, or both attempts if the caller was cancelled; a loser
+            # that answered in the same round as the winner is closed too
+            for task in attempts:
+                if task is not winner:
+                    await _discard(task)
+
+
+async def _discard(task: asyncio.Future) -> None:
+    """Stop an attempt whose result nobody will read."""
+    if not task.done():
+        task.cancel()
+        return
+    if task.cancelled() or task.exception() is not None:
+        return
+    result = task.result()
+    # Chat requests answer with (session, response)
+    response = result[-1] if isinstance(result, tuple) else result
+    stream = getattr(response, "_iterator", None)
+    if stream is not None and hasattr(stream, "aclose"):
+        try:
+            await stream.aclose()
+        except Exception as e:
+            logger.debug("Closing the losing stream failed: %s", e)
+
+
+gemini_client = GeminiClient(
+    KeyPool(GOOGLE_API_KEYS or [""]),
+    uncached=model,
+    retries=GEMINI_RETRIES,
+    hedge=HEDGE,
+)
@@ -0,0 +1,220 @@
+import datetime
+import re
+from functools import lru_cache
+
+# Dates and names taken from one message at most
+MAX_DATES = 3
+MAX_NAMES = 2
+
+MASTER_NUMBERS = (11, 22, 33)
+
+# Pythagorean letter values
+LETTER_VALUES = {
+    **{letter: i % 9 + 1 for i, letter in enumerate("АБВГДЕЁЖЗИЙКЛМНОПРСТУФХЦЧШЩЪЫЬЭЮЯ")},
+    **{letter: i % 9 + 1 for i, letter in enumerate("ABCDEFGHIJKLMNOPQRSTUVWXYZ")},
+}
+
+ELEMENTS = ("Дерево", "Огонь", "Земля", "Металл", "Вода")
+TIBETAN_ELEMENTS = ("Дерево", "Огонь", "Земля", "Железо", "Вода")
+CHINESE_ANIMALS = (
+    "Крыса", "Бык", "Тигр", "Кролик", "Дракон", "Змея",
+    "Лошадь", "Коза", "Обезьяна", "Петух", "Собака", "Свинья",
+)
+TIBETAN_ANIMALS = (
+    "Мышь", "Бык", "Тигр", "Заяц", "Дракон", "Змея",
+    "Лошадь", "Овца", "Обезьяна", "Птица", "Собака", "Свинья",
+)
+NINE_STARS = {
+    1: "Белая Вода",
+    2: "Чёрная Земля",
+    3: "Изумрудное Дерево",
+    4: "Зелёное Дерево",
+    5: "Жёлтая Земля",
+    6: "Белый Металл",
+    7: "Красный Металл",
+    8: "Белая Земля",
+    9: "Пурпурный Огонь",
+}
+MEWA_COLORS = {
+    1: "белая",
+    2: "чёрная",
+    3: "синяя",
+    4: "зелёная",
+    5: "жёлтая",
+    6: "белая",
+    7: "красная",
+    8: "белая",
+    9: "бордовая",
+}
+# Lo Shu magic square, read row by row
+LO_SHU = ((4, 9, 2), (3, 5, 7), (8, 1, 6))
+
+# First three letters of a month name, abbreviation or inflected form
+# ("мар", "марта", "мая", "сент."); "май" and "мая" differ already there
+MONTHS = {
+    "янв": 1, "фев": 2, "мар": 3, "апр": 4, "май": 5, "мая": 5, "июн": 6,
+    "июл": 7, "авг": 8, "сен": 9, "окт": 10, "ноя": 11, "дек": 12,
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+_DATE_RE = re.compile(
+    r"""
+    \b(?P<day>\d{1,2})[./-](?P<month>\d{1,2})[./-](?P<year>\d{4})\b
+    | \b(?P<iso_year>\d{4})-(?P<iso_month>\d{1,2})-(?P<iso_day>\d{1,2})\b
+    | \b(?P<word_day>\d{1,2})\s+(?P<word_month>[а-яёa-z]{3,9})\.?\s+(?P<word_year>\d{4})\b
+    """,
+    re.VERBOSE | re.IGNORECASE,
+)
+_NAME_RE = re.compile(
+    r"\b(?i:меня\s+зовут|мо[её]\s+имя|имя|фио|зовут|my\s+name\s+is|name)\s*[:\-—]?\s*"
+    r"(?P<name>[А-ЯЁA-Z][а-яёa-z]+(?:[\s-]+[А-ЯЁA-Z][а-яёa-z]+){0,2})"
+)
+
+
+def _reduce(number: int) -> int:
+    while number > 9 and number not in MASTER_NUMBERS:
+        number = sum(map(int, str(number)))
+    return number
+
+
+def _digit_root(number: int) -> int:
+    return (number - 1) % 9 + 1 if number else 0
+
+
+# Reduced values of every sum a date or a name of sensible length can produce
+REDUCED = tuple(_reduce(n) for n in range(1000))
+
+
+def reduce_number(number: int) -> int:
+    """Sum digits until one digit is left, keeping master numbers 11, 22, 33."""
+    return REDUCED[number] if number < len(REDUCED) else _reduce(number)
+
+
+def nine_star(year: int) -> int:
+    """Nine Star Ki year star: 11 minus the digit root of the year, wrapped into 1..9.
+
+    The Tibetan birth mewa of the year is the same Lo Shu number.
+    """
+    star = 11 - _digit_root(year)
+    return star - 9 if star > 9 else star
+
+
+def _year_entry(year: int) -> tuple[int, int, int]:
+    # The 60-year cycle starts with a Wood Rat year in 4 AD
+    return (year - 4) % 12, (year - 4) % 10, nine_star(year)
+
+
+# Animal, heavenly stem and year star of every year the bot is likely to see
+YEAR_TABLE = {year: _year_entry(year) for year in range(1900, 2101)}
+
+
+def solar_year(date: datetime.date) -> int:
+    """Year of the Chinese solar calendar, which starts at Lichun (about February 4).
+
+    Japanese and Tibetan year signs are counted from the same boundary.
+    """
+    return date.year - 1 if (date.month, date.day) < (2, 4) else date.year
+
+
+def parse_dates(text: str) -> list[datetime.date]:
+    """Find valid calendar dates (day first, ISO or with a month name) in text."""
+    dates = []
+    for match in _DATE_RE.finditer(text):
+        if match["day"]:
+            parts = int(match["year"]), int(match["month"]), int(match["day"])
+        elif match["iso_year"]:
+            parts = int(match["iso_year"]), int(match["iso_month"]), int(match["iso_day"])
+        else:
+            word = match["word_month"].lower()
+            month = MONTHS.get(word[:3])
+            if month is None:
+                continue
+            parts = int(match["word_year"]), month, int(match["word_day"])
+        try:
+            date = datetime.date(*parts)
+        except ValueError:
+            continue
+        if date not in dates:
+            dates.append(date)
+        if len(dates) == MAX_DATES:
+            break
+    return dates
+
+
+def parse_names(text: str) -> list[str]:
+    """Find names introduced with "меня зовут", "имя", "ФИО" and the like."""
+    names = []
+    for match in _NAME_RE.finditer(text):
+        name = " ".join(match["name"].split())
+        if name not in names:
+            names.append(name)
+        if len(names) == MAX_NAMES:
+            break
+    return names
+
+
+def life_path(date: datetime.date) -> int:
+    """Life path: day, month and year reduced separately, then their sum reduced."""
+    return reduce_number(
+        reduce_number(date.day) + reduce_number(date.month) + reduce_number(date.year)
+    )
+
+
+def destiny(name: str) -> int | None:
+    """Destiny (expression) number: Pythagorean values of all letters of the name."""
+    values = [LETTER_VALUES[letter] for letter in name.upper() if letter in LETTER_VALUES]
+    return reduce_number(sum(values)) if values else None
+
+
+def lo_shu_counts(date: datetime.date) -> dict[int, int]:
+    """How many times each digit 1..9 occurs in the date (DDMMYYYY)."""
+    digits = date.strftime("%d%m%Y")
+    return {digit: digits.count(str(digit)) for digit in range(1, 10)}
+
+
+@lru_cache(maxsize=4096)
+def date_report(date: datetime.date) -> str:
+    """Readable block with everything computed from a birth date."""
+    year = solar_year(date)
+    animal, stem, star = YEAR_TABLE.get(year) or _year_entry(year)
+    polarity = "Ян" if stem % 2 == 0 else "Инь"
+    counts = lo_shu_counts(date)
+    grid = " | ".join(
+        " ".join(str(digit) * counts[digit] or "-" for digit in row) for row in LO_SHU
+    )
+    missing = ", ".join(str(digit) for digit in range(1, 10) if not counts[digit]) or "нет"
+    return "\n".join(
+        [
+            f"Дата рождения {date:%d.%m.%Y}:",
+            f"- Число жизненного пути: {life_path(date)}",
+            f"- Число дня рождения: {reduce_number(date.day)}",
+            f"- Китайский гороскоп ({year} год по солнечному календарю): "
+            f"{ELEMENTS[stem // 2]} {CHINESE_ANIMALS[animal]}, {polarity}",
+            f"- Японская Кюсэй (Девять звёзд), звезда года: {star} {NINE_STARS[star]}",
+            f"- Тибетская астрология: {TIBETAN_ELEMENTS[stem // 2]} {TIBETAN_ANIMALS[animal]}, "
+            f"мева года рождения {star} ({MEWA_COLORS[star]})",
+            f"- Квадрат Ло Шу (ряды 4-9-2 | 3-5-7 | 8-1-6): {grid}; отсутствуют цифры: {missing}",
+        ]
+    )
+
+
+@lru_cache(maxsize=4096)
+def name_report(name: str) -> str | None:
+    number = destiny(name)
+    if number is None:
+        return None
+    return f"Имя {name}:\n- Число судьбы (выражения): {number}"
+
+
+def numerology_context(text: str) -> str | None:
+    """Structured block of precomputed numbers for the dates and names in text.
+
+    Returns None when the message contains neither, so ordinary questions
+    are sent to the model unchanged.
+    """
+    reports = [date_report(date) for date in parse_dates(text)]
+    reports += [report for report in map(name_report, parse_names(text)) if report]
+    if not reports:
+        return None
+    return "Расчёты бота (точные, используй их без пересчёта):\n\n" + "\n\n".join(reports)
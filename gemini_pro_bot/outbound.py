@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from gemini_pro_bot.config import env_float, env_int
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+from gemini_pro_bot.cluster import WORKER_COUNT
+from gemini_pro_bot.logs import current_trace, resume_trace
+from gemini_pro_bot.metrics import ERRORS, TELEGRAM_SEND
+from gemini_pro_bot.scheduler import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Telegram allows about 30 messages per second overall and about one per
+# second in a chat; a chat may briefly burst above that.
+TELEGRAM_GLOBAL_RATE = env_float("TELEGRAM_GLOBAL_RATE", 30)
+TELEGRAM_CHAT_RATE = env_float("TELEGRAM_CHAT_RATE", 1)
+TELEGRAM_CHAT_BURST = env_int("TELEGRAM_CHAT_BURST", 3)
+# Attempts after a transient network error, with exponential backoff from TELEGRAM_RETRY_DELAY seconds
+TELEGRAM_RETRIES = env_int("TELEGRAM_RETRIES", 3)
+TELEGRAM_RETRY_DELAY = 0.5
+# Idle chats above this count have their rate state dropped
+CHAT_STATE_LIMIT = 10000
+# Chat actions ("typing...") expire on their own and do not count against the
+# message limits, so they skip the rate buckets
+CHAT_ACTION_METHODS = frozenset({"send_action", "send_chat_action"})
+
+
+class _Job:
+    __slots__ = ("method", "args", "kwargs", "key", "future", "attempt", "trace", "action")
+
+    def __init__(self, method, args, kwargs, key, future) -> None:
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.future = future
+        self.attempt = 0
+        self.action = getattr(method, "__name__", "") in CHAT_ACTION_METHODS
+        # The chat's worker task logs the call under the submitting update's trace
+        self.trace = current_trace()
+
+
+class _ChatQueue:
+    __slots__ = ("jobs", "edits", "bucket", "paused_until", "worker")
+
+    def __init__(self, bucket: TokenBucket) -> None:
+        self.jobs: deque[_Job] = deque()
+        # Edits not started yet, by message id; newer text replaces theirs
+        self.edits: dict[int, _Job] = {}
+        self.bucket = bucket
+        self.paused_until = 0.0
+        self.worker: asyncio.Task | None = None
+
+
+def _route(method) -> tuple[int | None, int | None]:
+    """Chat id of a bound send/edit method and, for edits, the message id."""
+    owner = getattr(method, "__self__", None)
+    chat_id = getattr(owner, "chat_id", None)
+    if chat_id is None:
+        # Chat.send_action and other methods bound to a Chat
+        chat_id = getattr(owner, "id", None)
+    name = getattr(method, "__name__", "")
+    if name.startswith("edit_"):
+        return chat_id, getattr(owner, "message_id", None)
+    return chat_id, None
+
+
+class OutboundDispatcher:
+    """Single path for everything the bot sends to Telegram.
+
+    Calls are queued per chat and executed in order, paced by a per-chat and
+    a global token bucket (chat actions are not paced). ``RetryAfter`` pauses
+    the chat and puts the call back at the head of its queue; transient
+    network errors are retried with jittered exponential backoff. A timeout
+    is retried only for edits and chat actions: a message that timed out may
+    have been delivered, and sending it again would duplicate it. An edit of a message that already has an
+    edit waiting only replaces that edit's text, so fast streams cost one
+    request per slot instead of one per chunk.
+
+    Failed calls resolve to None, like the old ``safe_send``.
+    """
+
+    def __init__(self, global_rate, chat_rate, chat_burst, retries) -> None:
+        self.global_bucket = TokenBucket(global_rate * 60, capacity=global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.retries = retries
+        self._chats: dict[int | None, _ChatQueue] = {}
+
+    def submit(self, method, *args, **kwargs) -> asyncio.Future:
+        """Queue a call and return a future with its result."""
+        chat_id, message_id = _route(method)
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            if len(self._chats) >= CHAT_STATE_LIMIT:
+                self._prune()
+            chat = self._chats[chat_id] = _ChatQueue(
+                TokenBucket(self.chat_rate * 60, capacity=self.chat_burst)
+            )
+        if message_id is not None:
+            pending = chat.edits.get(message_id)
+            if pending is not None:
+                pending.method, pending.args, pending.kwargs = method, args, kwargs
+                pending.trace = current_trace()
+                return pending.future
+        job = _Job(method, args, kwargs, message_id, asyncio.get_running_loop().create_future())
+        chat.jobs.append(job)
+        if message_id is not None:
+            chat.edits[message_id] = job
+        if chat.worker is None:
+            chat.worker = asyncio.get_running_loop().create_task(self._work(chat))
+        return job.future
+
+    async def send(self, method, *args, **kwargs):
+        """Queue a call and wait for its result (None if it failed)."""
+        # A cancelled caller must not cancel a call other callers share
+        return await asyncio.shield(self.submit(method, *args, **kwargs))
+
+    async def _work(self, chat: _ChatQueue) -> None:
+        try:
+            while chat.jobs:
+                await self._wait_turn(chat, chat.jobs[0])
+                job = chat.jobs.popleft()
+                if job.key is not None and chat.edits.get(job.key) is job:
+                    del chat.edits[job.key]
+                await self._call(chat, job)
+        finally:
+            chat.worker = None
+
+    async def _wait_turn(self, chat: _ChatQueue, job: _Job) -> None:
+        while True:
+            delay = chat.paused_until - time.monotonic()
+            if not job.action:
+                delay = max(delay, chat.bucket.delay(1), self.global_bucket.delay(1))
+            if delay <= 0:
+                if not job.action:
+                    chat.bucket.take(1)
+                    self.global_bucket.take(1)
+                return
+            await asyncio.sleep(delay)
+
+    async def _call(self, chat: _ChatQueue, job: _Job) -> None:
+        resume_trace(job.trace)
+        name = getattr(job.method, "__name__", "send")
+        started = time.monotonic()
+        try:
+            result = await job.method(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            ERRORS.labels("RetryAfter").inc()
+            logger.warning("Flood control, retrying in %ss", e.retry_after)
+            chat.paused_until = time.monotonic() + e.retry_after
+            self._requeue(chat, job)
+            return
+        except Forbidden:
+            ERRORS.labels("Forbidden").inc()
+            logger.info("User blocked the bot. Message skipped.")
+            result = None
+        except BadRequest as e:
+            ERRORS.labels("BadRequest").inc()
+            logger.warning("BadRequest in %s: %s", name, e)
+            result = None
+        except NetworkError as e:
+            ERRORS.labels(type(e).__name__).inc()
+            # A send that timed out may have reached Telegram; only edits and
+            # chat actions are safe to repeat
+            repeatable = job.key is not None or job.action or not isinstance(e, TimedOut)
+            if repeatable and job.attempt < self.retries:
+                job.attempt += 1
+                delay = TELEGRAM_RETRY_DELAY * 2 ** (job.attempt - 1) * random.uniform(0.5, 1.5)
+                logger.warning("Network error, retry %s in %.1fs: %s", job.attempt, delay, e)
+                chat.paused_until = time.monotonic() + delay
+                self._requeue(chat, job)
+                return
+            logger.warning("Network error, message dropped: %s", e)
+            result = None
+        except Exception as e:
+            ERRORS.labels(type(e).__name__).inc()
+            logger.exception("Other send message error in %s", name)
+            result = None
+        finally:
+            elapsed = time.monotonic() - started
+            TELEGRAM_SEND.labels(name).observe(elapsed)
+            logger.debug("Telegram call", extra={"method": name, "seconds": round(elapsed, 3)})
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def _requeue(self, chat: _ChatQueue, job: _Job) -> None:
+        newer = chat.edits.get(job.key) if job.key is not None else None
+        if newer is not None:
+            # A newer edit of the message is already waiting; it answers both
+            newer.future.add_done_callback(
+                lambda done: job.future.done() or job.future.set_result(done.result())
+            )
+            return
+        chat.jobs.appendleft(job)
+        if job.key is not None:
+            chat.edits[job.key] = job
+
+    def _prune(self) -> None:
+        for chat_id, chat in list(self._chats.items()):
+            if chat.worker is None and chat.bucket.delay(self.chat_burst) == 0:
+                del self._chats[chat_id]
+
+
+# The global limit is per bot, so workers split it; a chat lives on one worker
+outbound = OutboundDispatcher(
+    TELEGRAM_GLOBAL_RATE / WORKER_COUNT, TELEGRAM_CHAT_RATE, TELEGRAM_CHAT_BURST, TELEGRAM_RETRIES
+)
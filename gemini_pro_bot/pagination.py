@@ -0,0 +1,57 @@
+import re
+
+PAGE_LENGTH = 3500
+CONTINUE_PROMPT = (
+    "✨ Продолжить анализ? Напишите 'да' или 'продолжай', "
+    "и я раскрою следующие аспекты вашей нумерологической карты."
+)
+CONTINUE_WORDS = frozenset({
+    "да", "давай", "продолжай", "продолжи", "продолжить", "продолжим",
+    "далее", "дальше", "еще", "ещё", "continue", "yes", "next",
+})
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def is_continuation(text: str) -> bool:
+    """True if the message only asks to continue, e.g. "Да, продолжай!"."""
+    words = _WORD_RE.findall(text.lower())
+    return bool(words) and len(words) <= 4 and all(word in CONTINUE_WORDS for word in words)
+
+
+def split_point(text: str, max_length: int) -> int:
+    """Ищет место разрыва не дальше max_length: перевод строки, конец фразы или жёсткий обрез."""
+    split_pos = text.rfind('\n', 0, max_length)
+    if split_pos == -1:
+        split_pos = text.rfind('. ', 0, max_length)
+        if split_pos != -1:
+            split_pos += 2
+    if split_pos <= 0:
+        split_pos = max_length
+    return split_pos
+
+
+def split_text(text: str, max_length: int) -> tuple[str, str]:
+    """Отрезает от markdown-текста начало не длиннее max_length.
+
+    Если разрез попал внутрь блока кода, блок закрывается в первой части
+    и открывается заново во второй.
+    """
+    split_pos = split_point(text, max_length)
+    head, tail = text[:split_pos], text[split_pos:].lstrip("\n")
+    if head.count("```") % 2:
+        head += "\n```"
+        tail = "```\n" + tail
+    return head, tail
+
+
+def paginate(text: str, page_length: int = PAGE_LENGTH) -> list[str]:
+    """Делит markdown-текст на страницы не длиннее page_length."""
+    pages = []
+    text = text.strip()
+    while len(text) > page_length:
+        page, text = split_text(text, page_length)
+        pages.append(page)
+    if text:
+        pages.append(text)
+    return pages
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from gemini_pro_bot.config import env_float, env_int, env_str
+from gemini_pro_bot.llm import MODEL_NAME, NUMEROLOGIST_PROMPT
+from gemini_pro_bot.sessions import SESSION_DB_PATH
+
+# "off", "memory" or "sqlite" (memory in front of a table in RESPONSE_CACHE_DB_PATH)
+RESPONSE_CACHE = env_str("RESPONSE_CACHE", "off").lower()
+RESPONSE_CACHE_DB_PATH = env_str("RESPONSE_CACHE_DB_PATH", SESSION_DB_PATH)
+RESPONSE_CACHE_TTL = env_float("RESPONSE_CACHE_TTL", 86400)
+RESPONSE_CACHE_SIZE = env_int("RESPONSE_CACHE_SIZE", 1000)
+# Rows kept in SQLite; the oldest are trimmed every TRIM_EVERY saves
+RESPONSE_CACHE_ROWS = env_int("RESPONSE_CACHE_ROWS", 20000)
+TRIM_EVERY = 100
+
+# Answers produced by another model or system prompt are never served
+PROMPT_VERSION = hashlib.sha256(f"{MODEL_NAME}\n{NUMEROLOGIST_PROMPT}".encode()).hexdigest()[:16]
+
+_DATE_RE = re.compile(r"\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_prompt(text: str) -> str:
+    """Fold case, spacing, trailing punctuation and date separators of a prompt."""
+    text = text.casefold().replace("ё", "е")
+    text = _DATE_RE.sub(lambda m: f"{int(m[1]):02d}.{int(m[2]):02d}.{m[3]}", text)
+    return _SPACE_RE.sub(" ", text).strip(" .,!?;:")
+
+
+def cache_key(text: str) -> str:
+    return hashlib.sha256(f"{PROMPT_VERSION}\n{normalize_prompt(text)}".encode()).hexdigest()
+
+
+class SQLiteResponseBackend:
+    """Shared tier: cached answers in a SQLite table, trimmed by age and count."""
+
+    def __init__(self, path: str, max_rows: int) -> None:
+        self.path = path
+        self.max_rows = max_rows
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._saves = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, answer TEXT NOT NULL, created REAL NOT NULL)"
+            )
+        return self._conn
+
+    def load(self, key: str, ttl: float) -> tuple[str, float] | None:
+        """Return the answer and its age in seconds, if it is younger than ttl."""
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT answer, created FROM responses WHERE key = ? AND created > ?",
+                (key, time.time() - ttl),
+            ).fetchone()
+        return (row[0], time.time() - row[1]) if row else None
+
+    def save(self, key: str, answer: str, ttl: float) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, answer, created) VALUES (?, ?, ?)",
+                (key, answer, time.time()),
+            )
+            self._saves += 1
+            if self._saves % TRIM_EVERY == 0:
+                conn.execute("DELETE FROM responses WHERE created <= ?", (time.time() - ttl,))
+                conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY created DESC LIMIT -1 OFFSET ?)",
+                    (self.max_rows,),
+                )
+
+
+class ResponseCache:
+    """Answers to first-turn prompts, keyed by normalized prompt and prompt version.
+
+    A bounded in-memory LRU with a TTL sits in front of an optional backend
+    shared by all processes.
+    """
+
+    def __init__(self, backend=None, max_size: int = 1000, ttl: float = 86400) -> None:
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl = ttl
+        self._hot: OrderedDict[str, tuple[str, float]] = OrderedDict()
+
+    async def get(self, text: str) -> str | None:
+        key = cache_key(text)
+        entry = self._hot.get(key)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            self._hot.move_to_end(key)
+            return entry[0]
+        self._hot.pop(key, None)
+        if self.backend is None:
+            return None
+        row = await asyncio.to_thread(self.backend.load, key, self.ttl)
+        if row is None:
+            return None
+        answer, age = row
+        self._remember(key, answer, time.monotonic() - age)
+        return answer
+
+    async def put(self, text: str, answer: str) -> None:
+        key = cache_key(text)
+        self._remember(key, answer)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.save, key, answer, self.ttl)
+
+    def _remember(self, key: str, answer: str, created: float | None = None) -> None:
+        self._hot[key] = (answer, time.monotonic() if created is None else created)
+        self._hot.move_to_end(key)
+        while len(self._hot) > self.max_size:
+            self._hot.popitem(last=False)
+
+
+class _NoCache:
+    """Stand-in used when RESPONSE_CACHE is off."""
+
+    async def get(self, text: str) -> None:
+        return None
+
+    async def put(self, text: str, answer: str) -> None:
+        pass
+
+
+if RESPONSE_CACHE == "sqlite":
+    response_cache = ResponseCache(
+        SQLiteResponseBackend(RESPONSE_CACHE_DB_PATH, RESPONSE_CACHE_ROWS),
+        max_size=RESPONSE_CACHE_SIZE,
+        ttl=RESPONSE_CACHE_TTL,
+    )
+elif RESPONSE_CACHE == "memory":
+    response_cache = ResponseCache(max_size=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+else:
+    response_cache = _NoCache()
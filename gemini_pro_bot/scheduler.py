@@ -0,0 +1,297 @@
+import asyncio
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from gemini_pro_bot.config import env_bool, env_int
+from gemini_pro_bot.cluster import WORKER_COUNT
+
+# Gemini quota of the API key; the defaults match the paid tier 1 limits
+GEMINI_RPM = env_int("GEMINI_RPM", 1000)
+GEMINI_TPM = env_int("GEMINI_TPM", 1000000)
+# Generations running at once across all chats
+GEMINI_CONCURRENCY = env_int("GEMINI_CONCURRENCY", 16)
+# Messages a single chat may have waiting behind its running generation
+CHAT_QUEUE_SIZE = env_int("CHAT_QUEUE_SIZE", 3)
+# Messages waiting across all chats before new ones are turned away
+MAX_WAITING = env_int("MAX_WAITING", 200)
+# A new message cancels the chat's unfinished generation instead of queueing behind it
+CANCEL_SUPERSEDED = env_bool("CANCEL_SUPERSEDED", True)
+
+
+class Rejected(Exception):
+    """Raised instead of queueing a request that would wait too long."""
+
+
+class TokenBucket:
+    """Refills ``per_minute`` units evenly over a minute.
+
+    Holds at most ``capacity`` units, a minute's worth by default.
+    """
+
+    def __init__(self, per_minute: float, capacity: float | None = None) -> None:
+        self.capacity = float(per_minute if capacity is None else capacity)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float) -> float:
+        """Seconds until ``amount`` units are available."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the API reported the quota exhausted."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class _Waiter:
+    __slots__ = ("chat_id", "tokens", "uses_model", "future", "ready", "rejected")
+
+    def __init__(self, chat_id, tokens, uses_model, future, ready=True) -> None:
+        self.chat_id = chat_id
+        self.tokens = tokens
+        self.uses_model = uses_model
+        self.future = future
+        # A reserved place is not admitted (and holds up its chat) until slot() fills it in
+        self.ready = ready
+        self.rejected: Rejected | None = None
+
+
+class FairScheduler:
+    """Admission control in front of the Gemini model.
+
+    Every chat has one request in flight at most and a bounded queue behind
+    it. Free slots go to chats in round-robin order, so one busy chat cannot
+    starve the others. A request is started only when the request and token
+    buckets sized to the API quota allow it, and is rejected right away when
+    its chat's queue or the global backlog is full.
+
+    Handlers run concurrently and await other things before asking for a
+    slot, so they take their chat's place in line with ``reserve`` first:
+    the chat's requests are then admitted in the order they arrived.
+    """
+
+    def __init__(self, rpm, tpm, concurrency, chat_queue_size, max_waiting) -> None:
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = concurrency
+        self.chat_queue_size = chat_queue_size
+        self.max_waiting = max_waiting
+        self._queues: OrderedDict[int, deque[_Waiter]] = OrderedDict()
+        self._busy: set[int] = set()
+        self._running = 0
+        self._waiting = 0
+        self._paused_until = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+
+    def reserve(self, chat_id: int) -> _Waiter:
+        """Take the chat's next place in line without waiting.
+
+        Call it before the handler's first ``await`` and pass the result to
+        ``slot`` as ``turn``. Until then the place holds up the chat's later
+        requests; give it back with ``cancel`` if ``slot`` is never reached.
+        A request that would be rejected gets a place with ``rejected`` set,
+        which ``slot`` raises; check it before the request cancels anything.
+        """
+        try:
+            return self._enqueue(chat_id, 0, True, ready=False)
+        except Rejected as e:
+            waiter = _Waiter(chat_id, 0, True, None, ready=False)
+            waiter.rejected = e
+            return waiter
+
+    def cancel(self, turn: _Waiter) -> None:
+        """Give back a reserved place that never got to ``slot``; no-op otherwise."""
+        if not turn.ready and turn.rejected is None:
+            turn.ready = True
+            self._remove(turn)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        chat_id: int,
+        tokens: int = 0,
+        uses_model: bool = True,
+        on_queued=None,
+        turn: _Waiter | None = None,
+    ):
+        """Wait for the chat's turn and hold it for the duration of the block.
+
+        Args:
+            chat_id (int): Chat the request belongs to.
+            tokens (int): Estimated input tokens of the request.
+            uses_model (bool): False for work that only needs the chat's
+                turn (e.g. resetting its session) and costs no quota.
+            on_queued: Optional coroutine function called with the queue
+                position when the request cannot start immediately.
+            turn: The place taken earlier with ``reserve``, if any.
+
+        Raises:
+            Rejected: If the chat's queue or the global backlog is full.
+        """
+        if turn is None:
+            waiter = self._enqueue(chat_id, tokens, uses_model)
+        else:
+            if turn.rejected is not None:
+                raise turn.rejected
+            waiter = turn
+            waiter.tokens, waiter.uses_model, waiter.ready = tokens, uses_model, True
+            self._dispatch()
+        try:
+            if not waiter.future.done() and on_queued is not None:
+                await on_queued(self.position(waiter))
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self._release(chat_id)
+            else:
+                self._remove(waiter)
+            raise
+        try:
+            yield
+        finally:
+            self._release(chat_id)
+
+    def backoff(self, seconds: float) -> None:
+        """Hold all admissions for ``seconds`` after the API answered 429."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self.requests.drain()
+        self._dispatch()
+
+    def position(self, waiter: _Waiter) -> int:
+        """Estimated 1-based place of the waiter in the round-robin order."""
+        queue = self._queues.get(waiter.chat_id, ())
+        if waiter not in queue:
+            return 0
+        index = list(queue).index(waiter)
+        ahead = sum(min(len(other), index + 1) for chat_id, other in self._queues.items()
+                    if chat_id != waiter.chat_id)
+        return ahead + index + 1
+
+    def _enqueue(self, chat_id, tokens, uses_model, ready=True) -> _Waiter:
+        queue = self._queues.get(chat_id)
+        if queue is not None and len(queue) >= self.chat_queue_size:
+            raise Rejected("You already have several messages waiting. Please wait for the answers.")
+        if self._waiting >= self.max_waiting:
+            raise Rejected("The bot is busy right now. Please try again in a minute.")
+        waiter = _Waiter(
+            chat_id, tokens, uses_model, asyncio.get_running_loop().create_future(), ready
+        )
+        if queue is None:
+            queue = self._queues[chat_id] = deque()
+        queue.append(waiter)
+        self._waiting += 1
+        self._dispatch()
+        return waiter
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.chat_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._waiting -= 1
+            if not queue:
+                del self._queues[waiter.chat_id]
+        self._dispatch()
+
+    def _release(self, chat_id: int) -> None:
+        self._busy.discard(chat_id)
+        self._running -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self._running < self.concurrency:
+            chat_id = next(
+                (c for c, queue in self._queues.items() if c not in self._busy and queue[0].ready),
+                None,
+            )
+            if chat_id is None:
+                return
+            queue = self._queues[chat_id]
+            waiter = queue[0]
+            if waiter.future.done():
+                # Its task was cancelled while queued
+                queue.popleft()
+                self._waiting -= 1
+                if not queue:
+                    del self._queues[chat_id]
+                continue
+            if waiter.uses_model:
+                delay = max(
+                    self._paused_until - time.monotonic(),
+                    self.requests.delay(1),
+                    self.tokens.delay(waiter.tokens),
+                )
+                if delay > 0:
+                    self._wake_in(delay)
+                    return
+                self.requests.take(1)
+                self.tokens.take(waiter.tokens)
+            queue.popleft()
+            if queue:
+                # Round robin: the chat goes to the back of the line
+                self._queues.move_to_end(chat_id)
+            else:
+                del self._queues[chat_id]
+            self._waiting -= 1
+            self._busy.add(chat_id)
+            self._running += 1
+            waiter.future.set_result(None)
+
+    def _wake_in(self, delay: float) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+
+class Generations:
+    """Tracks the handler task answering each chat.
+
+    With ``cancel_superseded`` a newer message cancels the chat's previous
+    task, whether it is still queued or already streaming, so the model
+    stops spending tokens on an answer nobody waits for.
+    """
+
+    def __init__(self, cancel_superseded: bool = True) -> None:
+        self.cancel_superseded = cancel_superseded
+        self._tasks: dict[int, asyncio.Task] = {}
+        self._superseded: weakref.WeakSet[asyncio.Task] = weakref.WeakSet()
+
+    def begin(self, chat_id: int) -> None:
+        """Register the current task as the chat's latest request."""
+        previous = self._tasks.get(chat_id)
+        if self.cancel_superseded and previous is not None and not previous.done():
+            self._superseded.add(previous)
+            previous.cancel()
+        self._tasks[chat_id] = asyncio.current_task()
+
+    def end(self, chat_id: int) -> None:
+        if self._tasks.get(chat_id) is asyncio.current_task():
+            del self._tasks[chat_id]
+
+    def superseded(self) -> bool:
+        """True if the current task was cancelled by a newer message."""
+        return asyncio.current_task() in self._superseded
+
+
+# Chats are spread evenly over the workers, so each gets an even share of the quota
+gemini_scheduler = FairScheduler(
+    GEMINI_RPM / WORKER_COUNT,
+    GEMINI_TPM / WORKER_COUNT,
+    max(1, GEMINI_CONCURRENCY // WORKER_COUNT),
+    CHAT_QUEUE_SIZE,
+    max(1, MAX_WAITING // WORKER_COUNT),
+)
+
+generations = Generations(CANCEL_SUPERSEDED)
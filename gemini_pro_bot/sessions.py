@@ -0,0 +1,171 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from gemini_pro_bot.config import env_float, env_int, env_str
+from google.generativeai import ChatSession
+from gemini_pro_bot.llm import model
+
+logger = logging.getLogger(__name__)
+
+# Where histories live: "sqlite" (a file shared by the processes of one
+# machine) or "redis" (shared by several machines; needs the redis package)
+SESSION_BACKEND = env_str("SESSION_BACKEND", "sqlite").lower()
+SESSION_DB_PATH = env_str("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_REDIS_URL = env_str("SESSION_REDIS_URL", "redis://localhost:6379/0")
+# Hot tier limits: number of live ChatSession objects and idle seconds
+SESSION_CACHE_SIZE = env_int("SESSION_CACHE_SIZE", 1000)
+SESSION_TTL = env_float("SESSION_TTL", 1800)
+
+
+def dump_history(history) -> bytes:
+    """Serialize a chat history to compressed JSON with only roles and texts."""
+    data = [
+        {"role": content.role, "parts": [{"text": part.text} for part in content.parts if part.text]}
+        for content in history
+    ]
+    return zlib.compress(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode())
+
+
+def load_history(blob: bytes) -> list[dict]:
+    """Inverse of dump_history; the result can be passed to start_chat."""
+    return json.loads(zlib.decompress(blob))
+
+
+class SQLiteSessionBackend:
+    """Cold tier: one compressed history blob per chat in a SQLite file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "chat_id INTEGER PRIMARY KEY, history BLOB NOT NULL, updated REAL NOT NULL)"
+            )
+        return self._conn
+
+    def load(self, chat_id: int) -> bytes | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT history FROM sessions WHERE chat_id = ?", (chat_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def save(self, chat_id: int, blob: bytes) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (chat_id, history, updated) VALUES (?, ?, ?)",
+                (chat_id, blob, time.time()),
+            )
+
+    def delete(self, chat_id: int) -> None:
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
+
+
+class RedisSessionBackend:
+    """Cold tier shared over the network: one compressed history per chat key."""
+
+    def __init__(self, url: str, prefix: str = "session:") -> None:
+        import redis
+
+        # The client keeps a thread-safe connection pool
+        self._redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, chat_id: int) -> bytes | None:
+        return self._redis.get(f"{self.prefix}{chat_id}")
+
+    def save(self, chat_id: int, blob: bytes) -> None:
+        self._redis.set(f"{self.prefix}{chat_id}", blob)
+
+    def delete(self, chat_id: int) -> None:
+        self._redis.delete(f"{self.prefix}{chat_id}")
+
+
+def session_backend():
+    """The backend selected by SESSION_BACKEND."""
+    if SESSION_BACKEND == "redis":
+        return RedisSessionBackend(SESSION_REDIS_URL)
+    if SESSION_BACKEND != "sqlite":
+        raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+    return SQLiteSessionBackend(SESSION_DB_PATH)
+
+
+class SessionStore:
+    """Chat sessions with a bounded in-memory hot tier over a persistent backend.
+
+    Live ChatSession objects are kept for at most ``max_size`` chats and
+    dropped after ``ttl`` idle seconds. Histories are written through to the
+    backend after every turn, so an evicted or lost session is rebuilt lazily
+    from its stored history on the chat's next message.
+
+    Any object with blocking ``load``, ``save`` and ``delete`` methods can be
+    the backend. The hot tier needs no invalidation across processes,
+    because each chat is always handled by the same worker.
+    """
+
+    def __init__(self, model, backend, max_size: int = 1000, ttl: float = 1800) -> None:
+        self.model = model
+        self.backend = backend
+        self.max_size = max_size
+        self.ttl = ttl
+        self._hot: OrderedDict[int, tuple[ChatSession, float]] = OrderedDict()
+
+    async def get(self, chat_id: int) -> ChatSession:
+        """Return the chat's session, rehydrating it from the backend if needed."""
+        entry = self._hot.pop(chat_id, None)
+        if entry is not None and time.monotonic() - entry[1] < self.ttl:
+            chat = entry[0]
+        else:
+            blob = await asyncio.to_thread(self.backend.load, chat_id)
+            history = load_history(blob) if blob else None
+            chat = self.model.start_chat(history=history)
+        self._hot[chat_id] = (chat, time.monotonic())
+        self._evict()
+        return chat
+
+    async def save(self, chat_id: int, chat: ChatSession) -> None:
+        """Persist the chat's history after a completed turn."""
+        try:
+            blob = dump_history(chat.history)
+        except Exception as e:
+            logger.warning("Session %s not saved: %s", chat_id, e)
+            return
+        await asyncio.to_thread(self.backend.save, chat_id, blob)
+
+    async def reset(self, chat_id: int) -> ChatSession:
+        """Start an empty session for the chat and forget the stored history."""
+        await asyncio.to_thread(self.backend.delete, chat_id)
+        chat = self.model.start_chat()
+        self._hot.pop(chat_id, None)
+        self._hot[chat_id] = (chat, time.monotonic())
+        self._evict()
+        return chat
+
+    def _evict(self) -> None:
+        # The dict is ordered by last access, so expired entries are at the front
+        deadline = time.monotonic() - self.ttl
+        while self._hot:
+            chat_id, (_, last_used) = next(iter(self._hot.items()))
+            if len(self._hot) <= self.max_size and last_used > deadline:
+                break
+            del self._hot[chat_id]
+
+
+session_store = SessionStore(
+    model,
+    session_backend(),
+    max_size=SESSION_CACHE_SIZE,
+    ttl=SESSION_TTL,
+)
@@ -0,0 +1,40 @@
+import logging
+from gemini_pro_bot.metrics import GEMINI_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+def record_usage(kind: str, response, elapsed: float) -> None:
+    """Count the tokens of a finished (fully iterated) response.
+
+    The totals are exported as ``bot_gemini_tokens_total``, so savings from
+    context caching or compaction show up in /metrics whatever the log
+    sampling rate.
+
+    Args:
+        kind (str): Which call produced the response, e.g. "chat" or "summary".
+        response: The Gemini response, after its stream was consumed.
+        elapsed (float): Seconds from sending the request to the last chunk.
+    """
+    try:
+        meta = response.usage_metadata
+    except Exception as e:
+        logger.warning("Usage of %s unavailable: %s", kind, e)
+        return
+    input_tokens = meta.prompt_token_count
+    cached_tokens = meta.cached_content_token_count
+    output_tokens = meta.candidates_token_count
+
+    GEMINI_TOKENS.labels(kind, "input").inc(input_tokens)
+    GEMINI_TOKENS.labels(kind, "cached").inc(cached_tokens)
+    GEMINI_TOKENS.labels(kind, "output").inc(output_tokens)
+    logger.info(
+        "Gemini usage",
+        extra={
+            "kind": kind,
+            "input_tokens": input_tokens,
+            "cached_tokens": cached_tokens,
+            "output_tokens": output_tokens,
+            "seconds": round(elapsed, 3),
+        },
+    )
@@ -1,7 +1,17 @@
 import threading
-from gemini_pro_bot.bot import start_bot
+from gemini_pro_bot.config import settings
+from gemini_pro_bot.logs import setup_logging
+from gemini_pro_bot.cluster import IS_WORKER
 from server import start_health_server
 
 if __name__ == "__main__":
-    threading.Thread(target=start_health_server, daemon=True).start()
+    setup_logging()
+    # In webhook mode the bot's own HTTP server answers health checks;
+    # workers answer them on their own port
+    if not settings.webhook_url and not IS_WORKER:
+        threading.Thread(target=start_health_server, daemon=True).start()
+    # Imported only now: loading the handlers and google.generativeai takes
+    # longer than the port may stay closed
+    from gemini_pro_bot.bot import start_bot
+
     start_bot()
@@ -1,21 +1,107 @@
 from http.server import HTTPServer, BaseHTTPRequestHandler
+import asyncio
+import logging
 import threading
-import os
+from gemini_pro_bot.config import settings
+from gemini_pro_bot.metrics import render_metrics
+
+logger = logging.getLogger(__name__)
 
 class HealthCheckHandler(BaseHTTPRequestHandler):
     def do_GET(self):
+        if self.path == '/metrics':
+            body, content_type = render_metrics()
+        else:
+            body, content_type = b'Bot is running', 'text/plain'
         self.send_response(200)
-        self.send_header('Content-type', 'text/plain')
+        self.send_header('Content-type', content_type)
         self.end_headers()
-        self.wfile.write(b'Bot is running')
+        self.wfile.write(body)
     
     def log_message(self, format, *args):
         pass  # Отключаем логи HTTP сервера
 
 def start_health_server():
-    port = int(os.environ.get('PORT', 10000))
+    port = settings.port
     server = HTTPServer(('0.0.0.0', port), HealthCheckHandler)
     thread = threading.Thread(target=server.serve_forever)
     thread.daemon = True
     thread.start()
-    print(f"Health check server started on port {port}")
+    logger.info("Health check server started on port %s", port)
+
+
+class AsyncHTTPServer:
+    """Minimal HTTP/1.1 server on the bot's event loop.
+
+    ``handler(method, path, headers, body)`` returns ``(status, body)`` or
+    ``(status, body, extra_headers)``. Keep-alive connections are supported,
+    since Telegram reuses them for webhook deliveries, and closed when idle.
+    """
+
+    MAX_BODY = 1024 * 1024
+    # An idle keep-alive connection is closed after IDLE_TIMEOUT seconds; a
+    # request must arrive in full within READ_TIMEOUT of its first line
+    IDLE_TIMEOUT = 60
+    READ_TIMEOUT = 30
+    REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+               413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+    def __init__(self, handler, port):
+        self.handler = handler
+        self.port = port
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._serve, '0.0.0.0', self.port)
+        logger.info("HTTP server started on port %s", self.port)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                async with asyncio.timeout(self.IDLE_TIMEOUT):
+                    request_line = await reader.readline()
+                if not request_line:
+                    break
+                async with asyncio.timeout(self.READ_TIMEOUT):
+                    method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                    headers = {}
+                    while True:
+                        line = await reader.readline()
+                        if line in (b'\r\n', b'\n', b''):
+                            break
+                        name, _, value = line.decode('latin-1').partition(':')
+                        headers[name.strip().lower()] = value.strip()
+                    length = int(headers.get('content-length', 0))
+                    if length > self.MAX_BODY:
+                        self._respond(writer, 413, b'', {'Connection': 'close'})
+                        await writer.drain()
+                        break
+                    body = await reader.readexactly(length) if length else b''
+                try:
+                    status, content, *extra = await self.handler(
+                        method, target.split('?', 1)[0], headers, body
+                    )
+                except Exception:
+                    logger.exception("HTTP handler failed on %s %s", method, target)
+                    self._respond(writer, 500, b'Internal Server Error', {'Connection': 'close'})
+                    await writer.drain()
+                    break
+                self._respond(writer, status, content, extra[0] if extra else {})
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, TimeoutError):
+            pass
+        finally:
+            writer.close()
+
+    def _respond(self, writer, status, content, headers):
+        headers = {'Content-Type': 'text/plain', **headers, 'Content-Length': len(content)}
+        head = [f"HTTP/1.1 {status} {self.REASONS.get(status, '')}"]
+        head += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + content)
@@ -0,0 +1,91 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_pro_bot import compaction
+from gemini_pro_bot.compaction import SUMMARY_HEADER, HistoryCompactor, content_text
+from gemini_pro_bot.llm import model
+from gemini_pro_bot.scheduler import FairScheduler
+
+CHAT_ID = 1
+
+
+def turns(*texts):
+    history = []
+    for text in texts:
+        history += [
+            {"role": "user", "parts": [{"text": f"q {text}"}]},
+            {"role": "model", "parts": [{"text": f"a {text}"}]},
+        ]
+    return history
+
+
+@pytest.fixture
+def chats(monkeypatch):
+    """The session store and summary model replaced by in-memory stand-ins."""
+    sessions = {CHAT_ID: model.start_chat(history=turns(1, 2, 3, 4))}
+    state = SimpleNamespace(sessions=sessions)
+
+    async def get(chat_id):
+        return sessions[chat_id]
+
+    async def save(chat_id, chat):
+        pass
+
+    async def summarize(contents):
+        state.summary_started.set()
+        await state.release.wait()
+        return "summary"
+
+    def start():
+        state.summary_started = asyncio.Event()
+        state.release = asyncio.Event()
+        scheduler = FairScheduler(1000, 10**6, 4, chat_queue_size=3, max_waiting=100)
+        monkeypatch.setattr(compaction, "gemini_scheduler", scheduler)
+        return scheduler
+
+    monkeypatch.setattr(compaction.session_store, "get", get)
+    monkeypatch.setattr(compaction.session_store, "save", save)
+    monkeypatch.setattr(compaction, "summarize", summarize)
+    state.start = start
+    return state
+
+
+def texts(chat):
+    return [content_text(content) for content in chat.history]
+
+
+def test_summary_does_not_hold_the_chats_turn(chats):
+    async def run():
+        scheduler = chats.start()
+        compaction_task = asyncio.create_task(HistoryCompactor(1, 2)._compact(CHAT_ID, 100))
+        await chats.summary_started.wait()
+        # The next message is admitted while the summary is being written
+        async with scheduler.slot(CHAT_ID):
+            chat = chats.sessions[CHAT_ID]
+            chat.history = [*chat.history, *turns(5)]
+        chats.release.set()
+        await compaction_task
+
+    # A summary that held the chat's turn would time out here
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert texts(chats.sessions[CHAT_ID]) == [
+        SUMMARY_HEADER + "summary",
+        compaction.SUMMARY_ACK,
+        "q 3", "a 3", "q 4", "a 4", "q 5", "a 5",
+    ]
+
+
+def test_summary_is_dropped_when_the_history_was_reset(chats):
+    async def run():
+        scheduler = chats.start()
+        compaction_task = asyncio.create_task(HistoryCompactor(1, 2)._compact(CHAT_ID, 100))
+        await chats.summary_started.wait()
+        async with scheduler.slot(CHAT_ID, uses_model=False):
+            chats.sessions[CHAT_ID] = model.start_chat(history=turns(9))
+        chats.release.set()
+        await compaction_task
+
+    asyncio.run(asyncio.wait_for(run(), 5))
+    assert texts(chats.sessions[CHAT_ID]) == ["q 9", "a 9"]
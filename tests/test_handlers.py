@@ -0,0 +1,97 @@
+import asyncio
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_pro_bot import handlers
+from gemini_pro_bot.scheduler import FairScheduler, Generations
+
+CHAT_ID = 1
+
+
+class FakeMessage:
+    def __init__(self, sent, text, message_id=0):
+        self.sent = sent
+        self.text = text
+        self.message_id = message_id
+        self.date = datetime.datetime.now(datetime.timezone.utc)
+
+    async def reply_text(self, text, **kwargs):
+        message = FakeMessage(self.sent, text, len(self.sent) + 100)
+        self.sent.append(message)
+        return message
+
+    async def edit_text(self, text, **kwargs):
+        self.text = text
+        return self
+
+
+@pytest.fixture
+def bot(monkeypatch):
+    """handle_message with Telegram, sessions and Gemini replaced by stand-ins."""
+    state = SimpleNamespace(sent=[], answered=[])
+
+    async def safe_send(send_method, *args, **kwargs):
+        # A network round trip: the other handlers of the burst run meanwhile
+        await asyncio.sleep(0)
+        return await send_method(*args, **kwargs)
+
+    async def get_session(chat_id):
+        return SimpleNamespace(history=[])
+
+    async def no_cached_answer(text):
+        return None
+
+    async def generate_chat_reply(update, context, init_msg, text):
+        await asyncio.sleep(0.01)
+        state.answered.append(text)
+        await init_msg.edit_text(f"answer to {text}")
+
+    monkeypatch.setattr(handlers, "safe_send", safe_send)
+    monkeypatch.setattr(handlers.session_store, "get", get_session)
+    monkeypatch.setattr(handlers.response_cache, "get", no_cached_answer)
+    monkeypatch.setattr(handlers, "generate_chat_reply", generate_chat_reply)
+    monkeypatch.setattr(handlers, "generations", Generations(cancel_superseded=True))
+    state.use_scheduler = lambda scheduler: monkeypatch.setattr(handlers, "gemini_scheduler", scheduler)
+    return state
+
+
+def make_update(sent, text, message_id):
+    return SimpleNamespace(
+        effective_chat=SimpleNamespace(id=CHAT_ID),
+        message=FakeMessage(sent, text, message_id),
+    )
+
+
+def test_rejected_message_does_not_supersede_the_queued_one(bot):
+    async def burst():
+        bot.use_scheduler(FairScheduler(1000, 10**6, 4, chat_queue_size=3, max_waiting=100))
+        context = SimpleNamespace(chat_data={})
+        await asyncio.gather(*(
+            handlers.handle_message(make_update(bot.sent, f"m{i}", i), context) for i in range(5)
+        ))
+
+    asyncio.run(burst())
+    # m0 and m1 were superseded, m3 and m4 found the chat's queue full
+    # and must not cancel m2 on their way out
+    assert bot.answered == ["m2"]
+    replies = [message.text for message in bot.sent]
+    assert replies.count("answer to m2") == 1
+    assert sum("several messages waiting" in reply for reply in replies) == 2
+
+
+def test_rejected_when_the_backlog_is_full(bot):
+    async def two_chats():
+        bot.use_scheduler(FairScheduler(1000, 10**6, 4, chat_queue_size=3, max_waiting=1))
+        context = SimpleNamespace(chat_data={})
+        first = make_update(bot.sent, "m0", 0)
+        other = make_update(bot.sent, "m1", 1)
+        other.effective_chat = SimpleNamespace(id=CHAT_ID + 1)
+        await asyncio.gather(
+            handlers.handle_message(first, context), handlers.handle_message(other, context)
+        )
+
+    asyncio.run(two_chats())
+    assert bot.answered == ["m0"]
+    assert any("busy" in message.text for message in bot.sent)
@@ -0,0 +1,108 @@
+import re
+
+import pytest
+
+from benchmarks.samples import corpus
+from gemini_pro_bot.html_format import format_message
+from gemini_pro_bot.html_split import split_html
+
+_TAG_RE = re.compile(r"<(/?)([a-z]+)[^>]*>")
+_BROKEN_ENTITY_RE = re.compile(r"&(?!(?:#\d+|#x[0-9a-fA-F]+|lt|gt|amp|quot);)")
+
+
+def assert_balanced(part):
+    stack = []
+    for match in _TAG_RE.finditer(part):
+        closing, name = match.groups()
+        if closing:
+            assert stack and stack.pop() == name, part
+        else:
+            stack.append(name)
+    assert not stack, part
+
+
+def text_of(parts):
+    return "".join(_TAG_RE.sub("", part) for part in parts)
+
+
+def test_short_html_is_one_part():
+    assert split_html("<b>Hello</b> world", 100) == ["<b>Hello</b> world"]
+
+
+def test_cut_inside_bold_closes_and_reopens():
+    html = "<b>" + "слово " * 20 + "</b>"
+    parts = split_html(html, 40)
+    assert len(parts) > 1
+    for part in parts:
+        assert part.startswith("<b>") and part.endswith("</b>")
+        assert_balanced(part)
+    assert text_of(parts) == "слово " * 20
+
+
+def test_cut_inside_pre_closes_and_reopens():
+    code = "".join(f"line {i}\n" for i in range(20))
+    parts = split_html(f"<pre><code>{code}</code></pre>", 60)
+    assert len(parts) > 1
+    for part in parts:
+        assert part.startswith("<pre><code>") and part.endswith("</code></pre>")
+        assert_balanced(part)
+    # Cut at line breaks, so no line is torn apart
+    assert all(text_of([part]).endswith("\n") for part in parts[:-1])
+    assert text_of(parts) == code
+
+
+@pytest.mark.parametrize("max_length", range(20, 40))
+def test_entity_is_never_split(max_length):
+    html = "a" * 17 + "&amp;&lt;&gt;&quot;" + "b" * 30
+    parts = split_html(html, max_length)
+    for part in parts:
+        assert not _BROKEN_ENTITY_RE.search(part), part
+    assert text_of(parts) == html
+
+
+@pytest.mark.parametrize("filler", range(3985, 3996))
+def test_entity_that_does_not_fit_starts_the_next_part(filler):
+    html = "<b>" + "x" * filler + "</b>&amp;"
+    parts = split_html(html, 4000)
+    assert all(len(part) <= 4000 for part in parts)
+    assert text_of(parts) == "x" * filler + "&amp;"
+
+
+def test_unknown_tags_are_unwrapped_and_attributes_dropped():
+    html = '<div class="x"><b style="color: red">жирный</b> <span>текст</span><br/></div>'
+    assert split_html(html) == ["<b>жирный</b> текст"]
+
+
+def test_href_is_quoted_and_escaped():
+    html = """<a href='https://example.com/?a=1&b="2"' target="_blank">ссылка</a>"""
+    assert split_html(html) == ['<a href="https://example.com/?a=1&amp;b=&quot;2&quot;">ссылка</a>']
+
+
+def test_unbalanced_tags_are_repaired():
+    assert split_html("<b>one <i>two</b> three</i> </u>four") == ["<b>one <i>two</i></b> three four"]
+
+
+def test_nesting_only_overflow_makes_progress():
+    html = "<b><i><u><s><code>abcdef</code></s></u></i></b>"
+    parts = split_html(html, 20)
+    assert text_of(parts) == "abcdef"
+    for part in parts:
+        assert_balanced(part)
+
+
+def test_no_empty_wrappers_after_cut_at_older_newline():
+    parts = split_html("<b><i>aaaaa\n</i></b>" + "x" * 60, 30)
+    assert parts[0] == "<b><i>aaaaa\n</i></b>"
+    assert all("<i></i>" not in part and "<b></b>" not in part for part in parts)
+    assert text_of(parts) == "aaaaa\n" + "x" * 60
+
+
+@pytest.mark.parametrize("max_length", [100, 500, 4000])
+def test_parts_fit_max_length(max_length):
+    for response in corpus(sizes=(3000, 10000), per_size=2):
+        html = format_message(response)
+        parts = split_html(html, max_length)
+        for part in parts:
+            assert len(part) <= max_length
+            assert_balanced(part)
+        assert text_of(parts).replace("\n", "") == text_of(split_html(html, None)).replace("\n", "")
@@ -0,0 +1,149 @@
+import datetime
+
+import pytest
+
+from gemini_pro_bot.numerology import (
+    MAX_DATES,
+    date_report,
+    destiny,
+    life_path,
+    lo_shu_counts,
+    nine_star,
+    numerology_context,
+    parse_dates,
+    parse_names,
+    reduce_number,
+    solar_year,
+)
+
+D = datetime.date
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("12.03.1990", D(1990, 3, 12)),
+        ("12/3/1990", D(1990, 3, 12)),
+        ("1990-03-12", D(1990, 3, 12)),
+        ("15 марта 1990", D(1990, 3, 15)),
+        ("15 мар 1990", D(1990, 3, 15)),
+        ("15 мар. 1990", D(1990, 3, 15)),
+        ("1 мая 2000", D(2000, 5, 1)),
+        ("1 май 2000", D(2000, 5, 1)),
+        ("3 янв 1991", D(1991, 1, 3)),
+        ("3 фев 1991", D(1991, 2, 3)),
+        ("3 апр 1991", D(1991, 4, 3)),
+        ("3 сен 1991", D(1991, 9, 3)),
+        ("3 сентября 1991", D(1991, 9, 3)),
+        ("3 окт. 1991", D(1991, 10, 3)),
+        ("3 ноя 1991", D(1991, 11, 3)),
+        ("3 дек 1991", D(1991, 12, 3)),
+        ("5 September 1985", D(1985, 9, 5)),
+        ("5 sept. 1985", D(1985, 9, 5)),
+        ("5 Mar 1985", D(1985, 3, 5)),
+    ],
+)
+def test_parse_dates(text, expected):
+    assert parse_dates(f"Я родилась {text}, что скажете?") == [expected]
+
+
+@pytest.mark.parametrize("text", ["31.02.1990", "15 мамы 1990", "12.13.1990", "просто вопрос"])
+def test_parse_dates_skips_invalid(text):
+    assert parse_dates(text) == []
+
+
+def test_parse_dates_dedupes_and_limits():
+    assert parse_dates("12.03.1990 и 1990-03-12") == [D(1990, 3, 12)]
+    text = " ".join(f"0{day}.01.2000" for day in range(1, 9))
+    assert len(parse_dates(text)) == MAX_DATES
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Меня зовут Анна Иванова, дата 12.03.1990", ["Анна Иванова"]),
+        ("Моё имя: Пётр", ["Пётр"]),
+        ("ФИО — Иванов Иван Иванович", ["Иванов Иван Иванович"]),
+        ("My name is John Smith", ["John Smith"]),
+        ("Как зовут кошку?", []),
+    ],
+)
+def test_parse_names(text, expected):
+    assert parse_names(text) == expected
+
+
+def test_reduce_number_keeps_master_numbers():
+    assert reduce_number(1990) == 1
+    assert reduce_number(29) == 11
+    assert reduce_number(1984) == 22
+    assert reduce_number(9) == 9
+
+
+@pytest.mark.parametrize(
+    "date, expected",
+    [
+        # 12 -> 3, 3, 1990 -> 1; 3 + 3 + 1 = 7
+        (D(1990, 3, 12), 7),
+        # 23 -> 5, 9, 1985 -> 5; 19 -> 1
+        (D(1985, 9, 23), 1),
+        # 7 + 3 + 1 = 11 stays a master number
+        (D(1990, 3, 7), 11),
+        # 9 + 11 + (1991 -> 2) = 22
+        (D(1991, 11, 9), 22),
+    ],
+)
+def test_life_path(date, expected):
+    assert life_path(date) == expected
+
+
+def test_destiny():
+    # А=1 Н=6 Н=6 А=1 -> 14 -> 5
+    assert destiny("Анна") == 5
+    # J=1 O=6 H=8 N=5 -> 20 -> 2
+    assert destiny("John") == 2
+    assert destiny("Анна") == destiny("анна")
+    assert destiny("---") is None
+
+
+@pytest.mark.parametrize(
+    "date, year",
+    [
+        (D(1990, 1, 31), 1989),
+        (D(1990, 2, 3), 1989),
+        (D(1990, 2, 4), 1990),
+        (D(1990, 12, 31), 1990),
+    ],
+)
+def test_solar_year_starts_on_february_4(date, year):
+    assert solar_year(date) == year
+
+
+@pytest.mark.parametrize(
+    "year, star",
+    [(1989, 2), (1990, 1), (1991, 9), (1999, 1), (2000, 9), (2024, 3)],
+)
+def test_nine_star(year, star):
+    assert nine_star(year) == star
+
+
+def test_date_report_uses_solar_year():
+    before = date_report(D(1990, 2, 3))
+    after = date_report(D(1990, 2, 4))
+    assert "1989 год" in before and "Земля Змея" in before and "звезда года: 2 " in before
+    assert "1990 год" in after and "Металл Лошадь, Ян" in after and "звезда года: 1 " in after
+
+
+def test_lo_shu_counts():
+    counts = lo_shu_counts(D(1990, 3, 12))
+    # 12031990
+    assert counts == {1: 2, 2: 1, 3: 1, 4: 0, 5: 0, 6: 0, 7: 0, 8: 0, 9: 2}
+    report = date_report(D(1990, 3, 12))
+    assert "отсутствуют цифры: 4, 5, 6, 7, 8" in report
+    assert "- 99 2 | 3 - - | - 11 -" in report
+
+
+def test_numerology_context():
+    assert numerology_context("Что такое число судьбы?") is None
+    context = numerology_context("Меня зовут Анна, родилась 15 мар. 1990")
+    assert "Дата рождения 15.03.1990" in context
+    assert "Имя Анна:\n- Число судьбы (выражения): 5" in context
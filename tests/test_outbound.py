@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from telegram.error import NetworkError, TimedOut
+
+from gemini_pro_bot import outbound as outbound_module
+from gemini_pro_bot.outbound import OutboundDispatcher
+
+
+class FakeChat:
+    """Bound methods routed like Message and Chat methods of the real bot."""
+
+    def __init__(self, failures=()):
+        self.chat_id = 1
+        self.message_id = 10
+        self.calls = []
+        self.failures = list(failures)
+
+    async def _call(self, name, text):
+        self.calls.append((name, text))
+        if self.failures:
+            raise self.failures.pop(0)
+        return text
+
+    async def reply_text(self, text):
+        return await self._call("reply_text", text)
+
+    async def edit_text(self, text):
+        return await self._call("edit_text", text)
+
+    async def send_action(self, action):
+        return await self._call("send_action", action)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(outbound_module, "TELEGRAM_RETRY_DELAY", 0.001)
+
+
+def dispatcher():
+    return OutboundDispatcher(global_rate=1000, chat_rate=1000, chat_burst=1000, retries=3)
+
+
+def test_send_that_timed_out_is_not_repeated():
+    chat = FakeChat(failures=[TimedOut()])
+
+    async def send():
+        return await dispatcher().send(chat.reply_text, "hello")
+
+    assert asyncio.run(send()) is None
+    assert chat.calls == [("reply_text", "hello")]
+
+
+@pytest.mark.parametrize("method", ["edit_text", "send_action"])
+def test_edit_and_chat_action_are_retried_after_timeout(method):
+    chat = FakeChat(failures=[TimedOut()])
+
+    async def send():
+        return await dispatcher().send(getattr(chat, method), "x")
+
+    assert asyncio.run(send()) == "x"
+    assert chat.calls == [(method, "x"), (method, "x")]
+
+
+def test_send_is_retried_after_other_network_errors():
+    chat = FakeChat(failures=[NetworkError("connection reset")])
+
+    async def send():
+        return await dispatcher().send(chat.reply_text, "hello")
+
+    assert asyncio.run(send()) == "hello"
+    assert len(chat.calls) == 2
+
+
+def test_chat_actions_do_not_use_the_rate_buckets():
+    chat = FakeChat()
+
+    async def send():
+        sender = OutboundDispatcher(global_rate=1, chat_rate=1, chat_burst=1, retries=0)
+        await sender.send(chat.send_action, "typing")
+        await sender.send(chat.send_action, "typing")
+        # The message still gets the one token the chat has
+        return await asyncio.wait_for(sender.send(chat.reply_text, "hello"), 0.5)
+
+    assert asyncio.run(send()) == "hello"
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+from gemini_pro_bot.scheduler import FairScheduler, Generations, Rejected, TokenBucket
+
+
+def scheduler(concurrency=1, chat_queue_size=3, max_waiting=100, rpm=1000, tpm=10**6):
+    return FairScheduler(rpm, tpm, concurrency, chat_queue_size, max_waiting)
+
+
+async def run_in_slot(scheduler, order, chat_id, label, turn=None):
+    async with scheduler.slot(chat_id, turn=turn):
+        order.append(label)
+        await asyncio.sleep(0)
+
+
+def test_requests_of_a_chat_run_in_order():
+    async def run():
+        fair = scheduler(concurrency=4)
+        order = []
+        turns = [fair.reserve(1) for _ in range(3)]
+
+        async def handler(index):
+            # Later messages reach slot() first, as after a slower await
+            await asyncio.sleep(0.01 * (3 - index))
+            await run_in_slot(fair, order, 1, index, turn=turns[index])
+
+        await asyncio.gather(*(handler(index) for index in range(3)))
+        return order
+
+    assert asyncio.run(run()) == [0, 1, 2]
+
+
+def test_chats_share_slots_round_robin():
+    async def run():
+        fair = scheduler(concurrency=1)
+        order = []
+        blocker = asyncio.Event()
+
+        async def hold():
+            async with fair.slot(0):
+                await blocker.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(run_in_slot(fair, order, chat_id, f"{chat_id}{index}"))
+            for chat_id, index in [(1, 0), (1, 1), (1, 2), (2, 0), (2, 1)]
+        ]
+        await asyncio.sleep(0)
+        blocker.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    assert asyncio.run(run()) == ["10", "20", "11", "21", "12"]
+
+
+def test_full_chat_queue_is_rejected():
+    async def run():
+        fair = scheduler(chat_queue_size=2)
+        first, second = fair.reserve(1), fair.reserve(1)
+        third = fair.reserve(1)
+        assert first.rejected is None and second.rejected is None
+        assert isinstance(third.rejected, Rejected)
+        with pytest.raises(Rejected):
+            async with fair.slot(1, turn=third):
+                pass
+        # Other chats are not affected
+        assert fair.reserve(2).rejected is None
+
+    asyncio.run(run())
+
+
+def test_max_waiting_is_rejected():
+    async def run():
+        fair = scheduler(max_waiting=2)
+        fair.reserve(1)
+        fair.reserve(2)
+        assert "busy" in str(fair.reserve(3).rejected)
+        with pytest.raises(Rejected):
+            async with fair.slot(4):
+                pass
+
+    asyncio.run(run())
+
+
+def test_cancelled_reservation_unblocks_the_chat():
+    async def run():
+        fair = scheduler()
+        order = []
+        abandoned = fair.reserve(1)
+        later = fair.reserve(1)
+        task = asyncio.create_task(run_in_slot(fair, order, 1, "later", turn=later))
+        await asyncio.sleep(0.01)
+        # The handler of the first message failed before it got to slot()
+        assert order == []
+        fair.cancel(abandoned)
+        await asyncio.wait_for(task, 1)
+        fair.cancel(later)
+        return order, fair._waiting
+
+    assert asyncio.run(run()) == (["later"], 0)
+
+
+def test_cancelled_while_queued():
+    async def run():
+        fair = scheduler(concurrency=1)
+        order = []
+        blocker = asyncio.Event()
+
+        async def hold():
+            async with fair.slot(1):
+                await blocker.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(run_in_slot(fair, order, 2, "cancelled"))
+        other = asyncio.create_task(run_in_slot(fair, order, 3, "other"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        blocker.set()
+        await asyncio.gather(holder, other)
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        return order, fair._waiting, fair._running
+
+    assert asyncio.run(run()) == (["other"], 0, 0)
+
+
+def test_token_bucket_delays_when_empty():
+    bucket = TokenBucket(per_minute=60, capacity=2)
+    assert bucket.delay(1) == 0
+    bucket.take(2)
+    assert 0.9 < bucket.delay(1) <= 1.0
+
+
+def test_newer_message_cancels_the_previous_generation():
+    async def run():
+        generations = Generations(cancel_superseded=True)
+        started = asyncio.Event()
+        outcomes = []
+
+        async def handler(label):
+            generations.begin(1)
+            started.set()
+            try:
+                await asyncio.sleep(1)
+                outcomes.append((label, "done"))
+            except asyncio.CancelledError:
+                outcomes.append((label, "superseded" if generations.superseded() else "cancelled"))
+            finally:
+                generations.end(1)
+
+        first = asyncio.create_task(handler("first"))
+        await started.wait()
+        second = asyncio.create_task(handler("second"))
+        await asyncio.sleep(0)
+        second.cancel()
+        await asyncio.gather(first, second)
+        return outcomes
+
+    assert asyncio.run(run()) == [("first", "superseded"), ("second", "cancelled")]
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from gemini_pro_bot.bot import webhook_handler
+from server import AsyncHTTPServer
+
+SECRET = "secret"
+HEADERS = {"x-telegram-bot-api-secret-token": SECRET}
+
+
+def application():
+    return SimpleNamespace(bot=None, update_queue=asyncio.Queue(maxsize=10))
+
+
+@pytest.mark.parametrize("body", [b"[]", b"1", b"{}", b"null", b'"update"', b"{", b"\xff"])
+def test_webhook_rejects_bodies_that_are_not_updates(body):
+    app = application()
+    handle = webhook_handler(app, SECRET, "/webhook")
+    status, *_ = asyncio.run(handle("POST", "/webhook", HEADERS, body))
+    assert status == 400
+    assert app.update_queue.empty()
+
+
+def test_webhook_queues_an_update():
+    app = application()
+    handle = webhook_handler(app, SECRET, "/webhook")
+    body = json.dumps({"update_id": 1}).encode()
+    status, *_ = asyncio.run(handle("POST", "/webhook", HEADERS, body))
+    assert status == 200
+    assert app.update_queue.get_nowait().update_id == 1
+
+
+async def serve(handler, **timeouts):
+    server = AsyncHTTPServer(handler, 0)
+    for name, seconds in timeouts.items():
+        setattr(server, name, seconds)
+    await server.start()
+    port = server._server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    return server, reader, writer
+
+
+def test_handler_error_is_answered_with_500():
+    async def failing(method, path, headers, body):
+        raise TypeError("boom")
+
+    async def run():
+        server, reader, writer = await serve(failing)
+        writer.write(b"POST /webhook HTTP/1.1\r\nContent-Length: 2\r\n\r\n[]")
+        status = await asyncio.wait_for(reader.readline(), 1)
+        writer.close()
+        await server.stop()
+        return status
+
+    assert asyncio.run(run()).startswith(b"HTTP/1.1 500")
+
+
+@pytest.mark.parametrize(
+    "request_bytes",
+    [b"", b"GET / HTTP/1.1\r\nHost: x\r\n"],
+    ids=["idle", "unfinished request"],
+)
+def test_silent_connection_is_closed(request_bytes):
+    async def handle(method, path, headers, body):
+        return 200, b"ok"
+
+    async def run():
+        server, reader, writer = await serve(handle, IDLE_TIMEOUT=0.05, READ_TIMEOUT=0.05)
+        writer.write(request_bytes)
+        data = await asyncio.wait_for(reader.read(), 1)
+        writer.close()
+        await server.stop()
+        return data
+
+    assert asyncio.run(run()) == b""